@@ -0,0 +1,396 @@
+"""
+Микробенчмарки divide-country.py
+
+сборка колец mergeWays (площадь не считается): время и пик выделенной
+памяти (tracemalloc)
+граф соседних областей на решетке 400x300 (120000 областей): построение,
+обходы и память графа Graph (CSR) и прежнего графа из словарей
+чтение OSM XML за один и за два прохода (--two-pass): элементов файла в
+секунду, прирост пикового RSS процесса, память прочитанных данных и пик
+памяти сверх нее (tracemalloc) на файлах двух размеров
+весь запуск скрипта (-n 3) на сетке 90x60 областей: время, пиковый RSS
+и md5 вывода, чтобы сравнить вывод версий
+
+запуск: python3 benchmark.py [--script PATH] [имена бенчмарков]
+--script - другая версия скрипта для сравнения, например
+    git show <commit>:divide-country.py > /tmp/old.py
+    python3 benchmark.py --script /tmp/old.py
+для pipeline скрипт запускается целиком и берет geographiclib из своего
+каталога, поэтому старую версию лучше взять вместе с деревом:
+    git worktree add /tmp/old <commit>
+    python3 benchmark.py --script /tmp/old/divide-country.py pipeline
+"""
+
+import argparse
+import hashlib
+import logging
+import multiprocessing
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+import tracemalloc
+from array import array
+from collections import OrderedDict, deque
+
+from tests.loader import ROOT, loadDivideCountry
+
+def ringWays(nrings, perring, npoints, rand = None):
+    """
+    линии nrings колец по perring линий из npoints точек
+    rand - случайные направления линий и порядок линий в кольце
+    возвращает ( линии, id линий всех колец подряд )
+    """
+    ways = dict()
+    members = []
+    wayid = 0
+    first = 0
+    for r in range(nrings):
+        ring = []
+        for k in range(perring):
+            wayid += 1
+            a = first + k*npoints
+            b = first + ((k+1) % perring)*npoints
+            ways[wayid] = array("q", [ a ] + list(range(a+1, a+npoints)) + [ b ])
+            if ( rand is not None and rand.random() < 0.5 ):
+                ways[wayid].reverse()
+            ring.append(wayid)
+        if ( rand is not None ):
+            rand.shuffle(ring)
+        members += ring
+        first += perring*npoints
+    return ( ways, members )
+
+def mergeways(dc, repeat = 3):
+    """
+    мс на сборку всех колец отношения
+    """
+    result = dict()
+    for name, ( nrings, perring ) in ( ( "1 ring x 5000 ways", ( 1, 5000 ) ),
+            ( "2000 rings x 3 ways", ( 2000, 3 ) ), ( "5000 rings x 2 ways", ( 5000, 2 ) ) ):
+        ways, members = ringWays(nrings, perring, 50)
+        dc.osm = { "ways": ways }
+        result[name] = min(timeit.repeat(lambda: dc.mergeWays(members), number = 1,
+            repeat = repeat)) * 1e3
+    return result
+
+def memory(dc):
+    """
+    пик выделенной памяти (МБ) при сборке длинных колец
+    """
+    result = dict()
+    rand = random.Random(3)
+    for name, ( nrings, perring, npoints ) in ( ( "coast 20 ways x 100k nodes", ( 1, 20, 100000 ) ),
+            ( "500 rings x 4 ways x 1k nodes", ( 500, 4, 1000 ) ) ):
+        ways, members = ringWays(nrings, perring, npoints, rand)
+        dc.osm = { "ways": ways }
+        tracemalloc.start()
+        dc.mergeWays(members)
+        result[name] = tracemalloc.get_traced_memory()[1] / 2**20
+        tracemalloc.stop()
+    return result
+
+def gridBorders(width, height, seed = 1):
+    """
+    области на решетке width x height со случайными диагоналями и
+    перемешанными id
+    возвращает ( border[s1][s2] - длина границы s1 < s2, площади областей )
+    """
+    rand = random.Random(seed)
+    ids = list(range(1, width*height+1))
+    rand.shuffle(ids)
+    border = dict()
+    def add(a, b):
+        border.setdefault(min(a, b), dict())[max(a, b)] = rand.uniform(1e3, 1e4)
+    for i in range(width):
+        for j in range(height):
+            s = ids[i*height+j]
+            if ( i+1 < width ):
+                add(s, ids[(i+1)*height+j])
+            if ( j+1 < height ):
+                add(s, ids[i*height+j+1])
+            if ( i+1 < width and j+1 < height and rand.random() < 0.3 ):
+                add(s, ids[(i+1)*height+j+1])
+    areas = { s: rand.uniform(1e6, 1e8) for s in ids }
+    return ( border, areas )
+
+# прежний граф из словарей и обходы по нему (до Graph), для сравнения
+
+def dictGraph(border):
+    """
+    G[s1][s2] - длина границы, как в createGraph
+    """
+    G = OrderedDict()
+    for s1 in sorted(border.keys()):
+        for s2 in sorted(border[s1].keys()):
+            if not s1 in G:
+                G[s1] = dict()
+            if not s2 in G:
+                G[s2] = dict()
+            G[s1][s2] = border[s1][s2]
+            G[s2][s1] = border[s1][s2]
+    return G
+
+def dictFarthestPoint(G, pointid):
+    bfs = dict()
+    bfs[pointid] = 1
+    Q = deque()
+    Q.append(pointid)
+    lastpoint = pointid
+    while ( len(Q) > 0 ):
+        p = Q.popleft()
+        for n in G[p]:
+            if not n in bfs:
+                bfs[n] = 1
+                Q.append(n)
+        lastpoint = p
+    return lastpoint
+
+def dictMarkParts(dc, G, bfs, startpoints):
+    Q = [ deque(), deque() ]
+    area = [0,0]
+    for p in range(0,2):
+        Q[p].append(startpoints[p])
+        area[p] = dc.shapes_areas[startpoints[p]]
+    while( len(Q[0]) > 0 or len(Q[1]) > 0 ):
+        part_id =  1
+        if ( ( area[0] < area[1] and len(Q[0]) > 0 )
+                or len(Q[1]) == 0  ):
+            part_id = 0
+        apart_id = abs(part_id - 1)
+        p = Q[part_id].popleft()
+        part_id = bfs[p]
+        dc.logger.debug("part {} p {} areapart {}".format(part_id,p,area[part_id]))
+        for n in G[p]:
+            if ( n in bfs ):
+                continue
+            bfs[n] = part_id
+            area[part_id] += dc.shapes_areas[n]
+            Q[part_id].append(n)
+            dc.logger.debug("part {} n {} arean {}".format(part_id,n,dc.shapes_areas[n]))
+            if (area[part_id] > area[apart_id] and len(Q[apart_id]) > 0):
+                Q[part_id].appendleft(p)
+                break
+
+def dictDivideGraph(dc, G, p1, p2):
+    bfs = {p1:0, p2:1}
+    dictMarkParts(dc, G, bfs, [p1,p2])
+    result = [[],[]]
+    for s in bfs:
+        result[bfs[s]].append(s)
+    return [ sorted(result[0]), sorted(result[1]) ]
+
+def graph(dc, repeat = 3):
+    """
+    секунды на построение графа, два поиска удаленной вершины (как при
+    делении пополам) и деление на две части: словари и Graph
+    """
+    border, dc.shapes_areas = gridBorders(400, 300)
+    best = lambda func: min(timeit.repeat(func, number = 1, repeat = repeat))
+    result = dict()
+    result["dict build"] = best(lambda: dictGraph(border))
+    G = dictGraph(border)
+    result["Graph build (from dict)"] = best(lambda: dc.Graph(G))
+    csr = dc.Graph(G)
+    start = next(iter(G))
+    far = lambda: dictFarthestPoint(G, dictFarthestPoint(G, start))
+    result["dict getFarthestPoint x2"] = best(far)
+    p2 = far()
+    p1 = dictFarthestPoint(G, p2)
+    result["dict divideGraph"] = best(lambda: dictDivideGraph(dc, G, p1, p2))
+    far = lambda: dc.getFarthestPoint(csr, dc.getFarthestPoint(csr, 0))
+    result["Graph getFarthestPoint x2"] = best(far)
+    p2 = far()
+    p1 = dc.getFarthestPoint(csr, p2)
+    result["Graph divideGraph"] = best(lambda: dc.divideGraph(csr, [p1, p2]))
+    return result
+
+def graphmemory(dc):
+    """
+    память (МБ), занятая графом из словарей и Graph
+    """
+    border, dc.shapes_areas = gridBorders(400, 300)
+    result = dict()
+    for name, build in ( ( "dict graph", lambda: dictGraph(border) ),
+            ( "Graph", lambda: dc.Graph(dictGraph(border)) ) ):
+        tracemalloc.start()
+        G = build()
+        result[name] = tracemalloc.get_traced_memory()[0] / 2**20
+        tracemalloc.stop()
+        del G
+    return result
+
+def writeOsm(filename, width, height, npoints = 20):
+    """
+    OSM XML: решетка width x height областей-отношений, стороны клеток -
+    линии из npoints точек; в каждой клетке еще дорога из 10 точек, не
+    входящая в отношения (ее пропускает чтение за два прохода)
+    возвращает число элементов файла
+    """
+    corner = lambda i, j: 1 + i*(height+1) + j
+    sides = [ ( i, j, i+1, j ) for i in range(width) for j in range(height+1) ]
+    sides += [ ( i, j, i, j+1 ) for i in range(width+1) for j in range(height) ]
+    nodeid = corner(width, height)
+    ways = []
+    with open(filename, "w") as f:
+        f.write("<?xml version='1.0' encoding='UTF-8'?>\n<osm version=\"0.6\">\n")
+        for i in range(width+1):
+            for j in range(height+1):
+                f.write(' <node id="{}" lat="{:.7f}" lon="{:.7f}"/>\n'.format(
+                    corner(i, j), 40 + j*0.01, i*0.01))
+        for i1, j1, i2, j2 in sides:
+            refs = [ corner(i1, j1) ]
+            for k in range(1, npoints-1):
+                nodeid += 1
+                t = k / (npoints-1)
+                f.write(' <node id="{}" lat="{:.7f}" lon="{:.7f}"/>\n'.format(nodeid,
+                    40 + (j1 + (j2-j1)*t)*0.01 + 1e-5*(k % 2), (i1 + (i2-i1)*t)*0.01))
+                refs.append(nodeid)
+            ways.append(refs + [ corner(i2, j2) ])
+        for c in range(width*height):
+            refs = []
+            for k in range(10):
+                nodeid += 1
+                f.write(' <node id="{}" lat="{:.7f}" lon="{:.7f}"/>\n'.format(nodeid,
+                    40.002 + (c % height)*0.01 + k*1e-4, 0.002 + (c // height)*0.01))
+                refs.append(nodeid)
+            ways.append(refs)
+        for wayid in range(1, len(ways)+1):
+            f.write(' <way id="{}">\n'.format(wayid))
+            for ref in ways[wayid-1]:
+                f.write('  <nd ref="{}"/>\n'.format(ref))
+            f.write(' </way>\n')
+        horizontal = lambda i, j: 1 + i*(height+1) + j
+        vertical = lambda i, j: 1 + width*(height+1) + i*height + j
+        for i in range(width):
+            for j in range(height):
+                f.write(' <relation id="{}">\n'.format(1 + i*height + j))
+                for wayid in ( horizontal(i, j), vertical(i+1, j), horizontal(i, j+1), vertical(i, j) ):
+                    f.write('  <member type="way" ref="{}" role="outer"/>\n'.format(wayid))
+                f.write('  <tag k="boundary" v="administrative"/>\n </relation>\n')
+        f.write("</osm>\n")
+    return nodeid + len(ways) + width*height
+
+def maxrss(usage = None):
+    """
+    пиковый RSS в МБ по usage (по умолчанию - этого процесса)
+    ru_maxrss в Linux - в КБ, в macOS - в байтах
+    """
+    if ( usage is None ):
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+    rss = usage.ru_maxrss
+    return rss / 2**20 if sys.platform == "darwin" else rss / 2**10
+
+def parseSpeed(filename, twopass, nelements):
+    """
+    ( элементов файла в секунду, прирост пикового RSS в МБ ) при чтении
+    в отдельном процессе
+    """
+    dc = loadDivideCountry()
+    rss = maxrss()
+    start = time.perf_counter()
+    dc.readOsmFile(filename, twopass)
+    return ( nelements / (time.perf_counter() - start), maxrss() - rss )
+
+def parsePeak(filename, twopass):
+    """
+    ( память прочитанных данных, пик памяти сверх нее ) в МБ
+    """
+    dc = loadDivideCountry()
+    tracemalloc.start()
+    osm = dc.readOsmFile(filename, twopass)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return ( current / 2**20, ( peak - current ) / 2**20 )
+
+def parse(dc):
+    """
+    чтение OSM XML: ( элементов/с, прирост пикового RSS, память
+    прочитанных данных, пик памяти сверх нее ); если разбор не строит
+    дерево, прирост RSS близок к памяти данных, а пик сверх нее не
+    растет с размером файла
+    каждый замер - в новом процессе, чтобы RSS не зависел от предыдущих
+    """
+    result = dict()
+    pool = multiprocessing.get_context("fork")
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for width, height in ( ( 60, 40 ), ( 120, 80 ) ):
+            filename = os.path.join(tmpdir, "grid.osm")
+            nelements = writeOsm(filename, width, height)
+            size = os.path.getsize(filename) / 2**20
+            for twopass in ( False, True ):
+                name = "{} {}k el {:.0f} MB".format("two-pass" if twopass else "single pass",
+                    nelements // 1000, size)
+                with pool.Pool(1, maxtasksperchild=1) as p:
+                    speed, rss = p.apply(parseSpeed, ( filename, twopass, nelements ))
+                with pool.Pool(1, maxtasksperchild=1) as p:
+                    data, peak = p.apply(parsePeak, ( filename, twopass ))
+                result[name] = ( speed, rss, data, peak )
+    return result
+
+def pipeline(dc, repeat = 2):
+    """
+    запуск скрипта dc целиком: ( секунды, пиковый RSS в МБ, начало md5
+    вывода ), время - лучшее из repeat запусков
+    """
+    result = dict()
+    with tempfile.TemporaryDirectory() as tmpdir:
+        filename = os.path.join(tmpdir, "grid.osm")
+        nelements = writeOsm(filename, 90, 60)
+        name = "-n 3 {}k el {:.0f} MB".format(nelements // 1000, os.path.getsize(filename) / 2**20)
+        best = None
+        rss = 0
+        # geographiclib - рядом со скриптом, иначе из этого дерева
+        env = dict(os.environ)
+        env["PYTHONPATH"] = os.pathsep.join(filter(None, ( ROOT, env.get("PYTHONPATH") )))
+        for r in range(repeat):
+            start = time.perf_counter()
+            proc = subprocess.Popen([ sys.executable, dc.__file__, "-f", filename, "-n", "3" ],
+                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, env=env)
+            output = proc.stdout.read()
+            proc.stdout.close()
+            pid, status, usage = os.wait4(proc.pid, 0)
+            elapsed = time.perf_counter() - start
+            if ( status != 0 ):
+                raise RuntimeError("{} failed with status {}".format(dc.__file__, status))
+            best = elapsed if best is None else min(best, elapsed)
+            rss = max(rss, maxrss(usage))
+        result[name] = ( best, rss, hashlib.md5(output).hexdigest()[:12] )
+    return result
+
+def setup(script = None):
+    """
+    загрузка скрипта, площадь колец заменяется числом точек
+    """
+    dc = loadDivideCountry(script)
+    dc.logger.setLevel(logging.ERROR)
+    dc.calcShapeArea = lambda ring: float(len(ring))
+    return dc
+
+BENCHMARKS = {
+    "mergeways": ( mergeways, "{:30} {:9.1f} ms" ),
+    "memory": ( memory, "{:30} {:9.1f} MB" ),
+    "graph": ( graph, "{:30} {:9.2f} s" ),
+    "graphmemory": ( graphmemory, "{:30} {:9.1f} MB" ),
+    "pipeline": ( pipeline, "{:26} {:7.2f} s {:6.1f} MB RSS  output md5 {}" ),
+    "parse": ( parse, "{:26} {:7.0f} el/s {:6.1f} MB RSS {:6.1f} MB data {:5.1f} MB extra" )
+}
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="micro benchmarks for divide-country.py")
+    parser.add_argument("--script", help="divide-country.py version to load (default: this tree)")
+    parser.add_argument("names", nargs="*",
+        help="benchmarks to run: {} (default: all)".format(", ".join(sorted(BENCHMARKS))))
+    args = parser.parse_args()
+    for name in args.names:
+        if ( name not in BENCHMARKS ):
+            parser.error("unknown benchmark {}".format(name))
+    dc = setup(args.script)
+    for name in args.names or sorted(BENCHMARKS):
+        func, fmt = BENCHMARKS[name]
+        for case, value in func(dc).items():
+            print(fmt.format(case, *( value if isinstance(value, tuple) else ( value, ) )))
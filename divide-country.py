@@ -16,13 +16,39 @@ license: WTFPL v.2
 
 from lxml import etree
 import logging
+import math
 import argparse
+import os
+import re
+import sys
+import mmap
+import hashlib
+import pickle
+import time
+import struct
+import zlib
+import gzip
+import bz2
+import lzma
+import queue
+import heapq
+import threading
+import multiprocessing
+from array import array
+from bisect import bisect_left
 from collections import deque, defaultdict, OrderedDict
+from itertools import accumulate, chain
 from geographiclib.geodesic import Geodesic
+from geographiclib.constants import Constants
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 osm = None
 shapes = OrderedDict() 
 shapes_areas = dict()
+area_method = "geodesic"
 nested_shapes = dict()
 
 class BadRingException(Exception):
@@ -33,33 +59,171 @@ class BadRingException(Exception):
     def __init__(self, message):
         self.message = message
 
+class NodeStore:
+    """
+    Компактное хранилище точек
+    id и координаты хранятся в непрерывных массивах, поиск точки -
+    двоичный поиск по отсортированному массиву id
+    """
+
+    def __init__(self, ids=None, lats=None, lons=None):
+        """
+        ids, lats, lons - готовые отсортированные по id массивы
+        (например, memoryview на отображенный в память кэш)
+        """
+        self.ids = array("q") if ids is None else ids
+        self.lats = array("d") if lats is None else lats
+        self.lons = array("d") if lons is None else lons
+        self.__sorted = True
+
+    def add(self, nodeid, lat, lon):
+        if ( len(self.ids) > 0 and nodeid <= self.ids[-1] ):
+            self.__sorted = False
+        self.ids.append(nodeid)
+        self.lats.append(lat)
+        self.lons.append(lon)
+
+    def finish(self):
+        """
+        сортировка по id после чтения, если точки шли не по порядку
+        (из повторяющихся id остается последняя точка)
+        """
+        if self.__sorted:
+            return
+        order = sorted(range(len(self.ids)), key=self.ids.__getitem__)
+        ids = array("q")
+        lats = array("d")
+        lons = array("d")
+        for i in order:
+            if ( len(ids) > 0 and ids[-1] == self.ids[i] ):
+                lats[-1] = self.lats[i]
+                lons[-1] = self.lons[i]
+                continue
+            ids.append(self.ids[i])
+            lats.append(self.lats[i])
+            lons.append(self.lons[i])
+        self.ids, self.lats, self.lons = ids, lats, lons
+        self.__sorted = True
+
+    def update(self, changes):
+        """
+        изменение точек: changes[id] = ( lat, lon ), None - удаление точки
+        """
+        added = []
+        deleted = set()
+        for nodeid, coords in changes.items():
+            i = self.index(nodeid)
+            if ( coords is None ):
+                if ( i >= 0 ):
+                    deleted.add(i)
+            elif ( i >= 0 ):
+                self.lats[i], self.lons[i] = coords
+            else:
+                added.append(( nodeid, coords ))
+        if deleted:
+            keep = [ i for i in range(len(self.ids)) if i not in deleted ]
+            self.ids = array("q", [ self.ids[i] for i in keep ])
+            self.lats = array("d", [ self.lats[i] for i in keep ])
+            self.lons = array("d", [ self.lons[i] for i in keep ])
+        for nodeid, coords in added:
+            self.add(nodeid, *coords)
+        self.finish()
+
+    def index(self, nodeid):
+        """
+        индекс точки в массивах или -1, если точки нет
+        """
+        i = bisect_left(self.ids, nodeid)
+        if ( i < len(self.ids) and self.ids[i] == nodeid ):
+            return i
+        return -1
+
+    def coords(self, nodeids):
+        """
+        координаты последовательности точек в виде двух массивов numpy
+        ( lats, lons ), поиск сразу для всех точек
+        """
+        ids = numpy.asarray(self.ids, dtype=numpy.int64)
+        want = numpy.asarray(nodeids, dtype=numpy.int64)
+        i = numpy.searchsorted(ids, want)
+        found = i < len(ids)
+        found[found] = ids[i[found]] == want[found]
+        if ( not found.all() ):
+            raise KeyError(int(want[~found][0]))
+        return ( numpy.asarray(self.lats)[i], numpy.asarray(self.lons)[i] )
+
+    def __contains__(self, nodeid):
+        return self.index(nodeid) >= 0
+
+    def __getitem__(self, nodeid):
+        i = self.index(nodeid)
+        if ( i < 0 ):
+            raise KeyError(nodeid)
+        return ( self.lats[i], self.lons[i] )
+
+    def __len__(self):
+        return len(self.ids)
+
 class OsmTarget:
     """
     XML handler
+    ways, nodes - множества id линий и точек, которые нужно сохранить
+    (None - сохранять все)
+    rels - сохранять ли отношения
     """
     __countNodes=0;
     __countWays=0;
     __countRels=0;
     __finished=False;
     __good_relation=False;
-    def __init__(self, result):
+    __wayid=None;
+    def __init__(self, result, ways=None, nodes=None, rels=True):
         self.__result = result
-        self.__result["nodes"] = dict()
-        self.__result["ways"] = dict()
-        self.__result["rels"] = { "outer": dict(), "inner": dict() }
+        self.__ways = ways
+        self.__nodes = nodes
+        self.__rels = rels
+        self.__result.setdefault("nodes",NodeStore())
+        self.__result.setdefault("ways",dict())
+        self.__result.setdefault("rels",{ "outer": dict(), "inner": dict() })
+    def node(self, nodeid, lat, lon):
+        """
+        добавить точку
+        """
+        if ( self.__nodes is not None and nodeid not in self.__nodes ):
+            return
+        self.__countNodes += 1;
+        self.__result["nodes"].add(nodeid, lat, lon)
+    def way(self, wayid, refs):
+        """
+        добавить линию, возвращает False, если линия не нужна
+        """
+        if ( self.__ways is not None and wayid not in self.__ways ):
+            return False
+        self.__countWays += 1;
+        self.__result["ways"][wayid] = refs
+        return True
+    def relation(self, relid, outer, inner):
+        """
+        добавить отношение, возвращает False, если отношения не нужны
+        """
+        if ( not self.__rels ):
+            return False
+        self.__countRels += 1;
+        self.__result["rels"]["outer"][relid] = outer
+        self.__result["rels"]["inner"][relid] = inner
+        return True
     def start(self, tag, attrib):
         if (tag=="node"): 
-            self.__countNodes += 1;
-            self.__result["nodes"][attrib["id"]] = [ attrib["lat"], attrib["lon"] ]
+            self.node(int(attrib["id"]), float(attrib["lat"]), float(attrib["lon"]))
         elif (tag=="nd"):
-            self.__result["ways"][self.__wayid].append(attrib["ref"])
+            if ( self.__wayid is not None ):
+                self.__result["ways"][self.__wayid].append(int(attrib["ref"]))
         elif (tag=="way"):
-            self.__countWays += 1;
-            self.__wayid = attrib["id"]
-            self.__result["ways"][self.__wayid] = [ ]
+            wayid = int(attrib["id"])
+            self.__wayid = wayid if self.way(wayid, array("q")) else None
         elif (tag=="member" and self.__good_relation ):
             memtype=attrib["type"];
-            ref=attrib["ref"];
+            ref=int(attrib["ref"]);
             role=attrib["role"];
             if (memtype=="way" and role == "outer"):
                 self.__result["rels"]["outer"][self.__relid].append(ref)
@@ -69,11 +233,8 @@ class OsmTarget:
             if ( attrib.get("action") == "delete" ):
                 self.__good_relation = False
                 return
-            self.__good_relation = True
-            self.__countRels += 1;
-            self.__relid=attrib["id"];
-            self.__result["rels"]["outer"][self.__relid] = [ ]
-            self.__result["rels"]["inner"][self.__relid] = [ ]
+            self.__relid=int(attrib["id"]);
+            self.__good_relation = self.relation(self.__relid, [ ], [ ])
         elif (tag=="osm"): 
             logger.info("parsing XML");
 #    def end(self, tag):
@@ -84,19 +245,426 @@ class OsmTarget:
 #        return
     def close(self):
         logger.info("rels: {0}, ways: {1}, nodes: {2}".format(self.__countRels,self.__countWays,self.__countNodes))
-        logger.info("end of the XML")
+        logger.info("end of the OSM data")
+        # парсер lxml ссылается на target через цикл ссылок, поэтому
+        # множества нужных линий и точек освобождаются здесь, не
+        # дожидаясь сборщика мусора
+        self.__ways = None
+        self.__nodes = None
         return "closed!"
+    def count(self):
+        """
+        количество прочитанных элементов (точки, линии, отношения)
+        """
+        return self.__countNodes + self.__countWays + self.__countRels
 
-def readOsmFile(filename):
+class OscTarget:
     """
-    Чтение данных из файла формата OSM XML
+    osmChange handler
+    changes["nodes"|"ways"|"rels"][id] - новое значение элемента
+    (None - элемент удален)
     """
-    result=dict()
-    osmTarget=OsmTarget(result);
+    __action=None;
+    __wayid=None;
+    __relid=None;
+    def __init__(self, changes):
+        self.__changes = changes
+        self.__changes["nodes"] = dict()
+        self.__changes["ways"] = dict()
+        self.__changes["rels"] = dict()
+    def start(self, tag, attrib):
+        if (tag in ("create","modify","delete")):
+            self.__action = tag
+        elif (tag=="node"):
+            nodeid = int(attrib["id"])
+            if ( self.__action == "delete" ):
+                self.__changes["nodes"][nodeid] = None
+            else:
+                self.__changes["nodes"][nodeid] = ( float(attrib["lat"]), float(attrib["lon"]) )
+        elif (tag=="way"):
+            self.__wayid = int(attrib["id"])
+            self.__changes["ways"][self.__wayid] = None if self.__action == "delete" else array("q")
+        elif (tag=="nd" and self.__changes["ways"][self.__wayid] is not None):
+            self.__changes["ways"][self.__wayid].append(int(attrib["ref"]))
+        elif (tag=="relation"):
+            self.__relid = int(attrib["id"])
+            self.__changes["rels"][self.__relid] = None if self.__action == "delete" else ( [ ], [ ] )
+        elif (tag=="member" and self.__changes["rels"][self.__relid] is not None):
+            if ( attrib["type"] == "way" and attrib["role"] in ("outer","inner") ):
+                self.__changes["rels"][self.__relid][attrib["role"] == "inner"].append(int(attrib["ref"]))
+    def close(self):
+        logger.info("changed rels: {0}, ways: {1}, nodes: {2}".format(len(self.__changes["rels"]),
+            len(self.__changes["ways"]),len(self.__changes["nodes"])))
+        return "closed!"
+
+class ThreadedReader:
+    """
+    Чтение файла блоками в отдельном потоке
+    распаковка идет параллельно с разбором
+    """
+
+    def __init__(self, f, chunksize=1<<20, depth=4):
+        self.__f = f
+        self.__chunksize = chunksize
+        self.__queue = queue.Queue(depth)
+        self.__buffer = bytearray()
+        self.__eof = False
+        self.__closed = False
+        self.__thread = threading.Thread(target=self.__run, daemon=True)
+        self.__thread.start()
+
+    def __run(self):
+        try:
+            while not self.__closed:
+                chunk = self.__f.read(self.__chunksize)
+                self.__queue.put(chunk)
+                if not chunk:
+                    break
+        except Exception as e:
+            self.__queue.put(e)
+
+    def read(self, size=-1):
+        while ( ( size < 0 or len(self.__buffer) < size ) and not self.__eof ):
+            chunk = self.__queue.get()
+            if isinstance(chunk, Exception):
+                raise chunk
+            if not chunk:
+                self.__eof = True
+            self.__buffer += chunk
+        if ( size < 0 ):
+            size = len(self.__buffer)
+        data = bytes(self.__buffer[:size])
+        del self.__buffer[:size]
+        return data
+
+    def close(self):
+        self.__closed = True
+        while self.__thread.is_alive():
+            try:
+                self.__queue.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        self.__f.close()
+
+def openOsmFile(filename):
+    """
+    открытие файла в двоичном режиме
+    сжатые файлы (gzip, bzip2, xz) распаковываются на лету в отдельном потоке
+    """
+    f=open(filename,"rb")
+    magic=f.read(6)
+    f.seek(0)
+    # сжатый файл открывается заново по имени: GzipFile, BZ2File и
+    # LZMAFile закрывают только файлы, которые открыли сами
+    if (magic.startswith(b"\x1f\x8b")):
+        f.close()
+        return ThreadedReader(gzip.open(filename,"rb"))
+    if (magic.startswith(b"BZh")):
+        f.close()
+        return ThreadedReader(bz2.open(filename,"rb"))
+    if (magic.startswith(b"\xfd7zXZ\x00")):
+        f.close()
+        return ThreadedReader(lzma.open(filename,"rb"))
+    return f
+
+def parseOsmFile(filename,osmTarget):
+    """
+    разбор OSM XML файла с передачей элементов в osmTarget
+    парсер с target не строит дерево, поэтому память на разбор не
+    зависит от размера файла
+    """
+    f=openOsmFile(filename);
     parser=etree.XMLParser(target=osmTarget);
-    f=open(filename,"r");
     etree.parse(f,parser);
     f.close();
+    return osmTarget.count()
+
+class PbfException(Exception):
+    """
+    Ошибка разбора файла формата OSM PBF
+    """
+
+    def __init__(self, message):
+        self.message = message
+
+def pbfVarint(buf,pos):
+    """
+    чтение varint из буфера, возвращает ( значение, новая позиция )
+    """
+    value = 0
+    shift = 0
+    while True:
+        b = buf[pos]
+        pos += 1
+        value |= (b & 0x7f) << shift
+        if not (b & 0x80):
+            return ( value, pos )
+        shift += 7
+
+def pbfSigned(value):
+    """
+    varint типа int64 (отрицательные числа в дополнительном коде)
+    """
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+def pbfZigzag(value):
+    """
+    varint типа sint64
+    """
+    return (value >> 1) ^ -(value & 1)
+
+def pbfMessage(buf):
+    """
+    перебор полей protobuf сообщения
+    выдает ( номер поля, тип, значение ), для типа 2 значение - срез буфера
+    """
+    pos = 0
+    end = len(buf)
+    while pos < end:
+        key, pos = pbfVarint(buf,pos)
+        wiretype = key & 7
+        if (wiretype == 0):
+            value, pos = pbfVarint(buf,pos)
+        elif (wiretype == 2):
+            size, pos = pbfVarint(buf,pos)
+            value = buf[pos:pos+size]
+            pos += size
+        elif (wiretype == 1):
+            value = buf[pos:pos+8]
+            pos += 8
+        elif (wiretype == 5):
+            value = buf[pos:pos+4]
+            pos += 4
+        else:
+            raise PbfException("unsupported protobuf wire type {}".format(wiretype))
+        yield ( key >> 3, wiretype, value )
+
+def pbfPacked(buf):
+    """
+    упакованный массив varint
+    """
+    result = []
+    value = 0
+    shift = 0
+    for b in buf:
+        value |= (b & 0x7f) << shift
+        if (b & 0x80):
+            shift += 7
+        else:
+            result.append(value)
+            value = 0
+            shift = 0
+    return result
+
+def pbfDelta(buf):
+    """
+    упакованный массив sint64, закодированный разностями
+    """
+    return accumulate(pbfZigzag(v) for v in pbfPacked(buf))
+
+def readPbfBlobs(f):
+    """
+    перебор блоков файла OSM PBF, выдает ( тип блока, сжатый блок )
+    """
+    while True:
+        head = f.read(4)
+        if ( len(head) < 4 ):
+            return
+        blobtype = None
+        datasize = 0
+        for field, wiretype, value in pbfMessage(f.read(struct.unpack(">I",head)[0])):
+            if (field == 1):
+                blobtype = value.decode()
+            elif (field == 3):
+                datasize = value
+        yield ( blobtype, f.read(datasize) )
+
+def decodePbfBlob(blob):
+    """
+    распаковка блока
+    """
+    for field, wiretype, value in pbfMessage(blob):
+        if (field == 1):
+            return value
+        elif (field == 3):
+            return zlib.decompress(value)
+        elif (field == 4):
+            return lzma.decompress(value)
+    raise PbfException("unsupported PBF blob compression")
+
+def decodePbfHeader(blob):
+    """
+    проверка заголовка OSMHeader
+    """
+    for field, wiretype, value in pbfMessage(decodePbfBlob(blob)):
+        if ( field == 4 and value.decode() not in ("OsmSchema-V0.6","DenseNodes") ):
+            raise PbfException("unsupported PBF feature {}".format(value.decode()))
+
+def decodePbfBlock(task):
+    """
+    разбор блока PrimitiveBlock
+    task - ( сжатый блок, какие элементы нужны: "nodes", "ways", "rels" )
+    выход - ( ( id, lat, lon ) точек, [ ( id, точки ) ] линий,
+    [ ( id, outer, inner ) ] отношений )
+    """
+    blob, kinds = task
+    data = memoryview(decodePbfBlob(blob))
+    strings = []
+    groups = []
+    granularity = 100
+    latoffset = 0
+    lonoffset = 0
+    for field, wiretype, value in pbfMessage(data):
+        if (field == 1):
+            strings = [ bytes(s) for f, w, s in pbfMessage(value) if f == 1 ]
+        elif (field == 2):
+            groups.append(value)
+        elif (field == 17):
+            granularity = value
+        elif (field == 19):
+            latoffset = pbfSigned(value)
+        elif (field == 20):
+            lonoffset = pbfSigned(value)
+    nodes = ( array("q"), array("d"), array("d") )
+    ways = []
+    rels = []
+    for group in groups:
+        for field, wiretype, value in pbfMessage(group):
+            if ( field == 2 and "nodes" in kinds ):
+                # DenseNodes
+                for f, w, v in pbfMessage(value):
+                    if (f == 1):
+                        nodes[0].extend(pbfDelta(v))
+                    elif (f == 8):
+                        nodes[1].extend((latoffset + granularity * lat) / 1e9 for lat in pbfDelta(v))
+                    elif (f == 9):
+                        nodes[2].extend((lonoffset + granularity * lon) / 1e9 for lon in pbfDelta(v))
+            elif ( field == 1 and "nodes" in kinds ):
+                for f, w, v in pbfMessage(value):
+                    if (f == 1):
+                        nodes[0].append(pbfZigzag(v))
+                    elif (f == 8):
+                        nodes[1].append((latoffset + granularity * pbfZigzag(v)) / 1e9)
+                    elif (f == 9):
+                        nodes[2].append((lonoffset + granularity * pbfZigzag(v)) / 1e9)
+            elif ( field == 3 and "ways" in kinds ):
+                wayid = None
+                refs = array("q")
+                for f, w, v in pbfMessage(value):
+                    if (f == 1):
+                        wayid = pbfSigned(v)
+                    elif (f == 8):
+                        refs.extend(pbfDelta(v))
+                ways.append(( wayid, refs ))
+            elif ( field == 4 and "rels" in kinds ):
+                relid = None
+                roles = []
+                memids = []
+                types = []
+                for f, w, v in pbfMessage(value):
+                    if (f == 1):
+                        relid = pbfSigned(v)
+                    elif (f == 8):
+                        roles = pbfPacked(v)
+                    elif (f == 9):
+                        memids = list(pbfDelta(v))
+                    elif (f == 10):
+                        types = pbfPacked(v)
+                members = { b"outer": [], b"inner": [] }
+                for role, memid, memtype in zip(roles, memids, types):
+                    if ( memtype == 1 and strings[role] in members ):
+                        members[strings[role]].append(memid)
+                rels.append(( relid, members[b"outer"], members[b"inner"] ))
+    return ( nodes, ways, rels )
+
+def readPbfTasks(f,kinds):
+    """
+    задания разбора блоков OSMData по мере чтения файла f
+    заголовок OSMHeader проверяется сразу
+    """
+    for blobtype, blob in readPbfBlobs(f):
+        if (blobtype == "OSMHeader"):
+            decodePbfHeader(blob)
+        elif (blobtype == "OSMData"):
+            yield ( blob, kinds )
+
+def poolImap(pool,func,tasks,ahead):
+    """
+    как pool.imap, но в работе не больше ahead заданий: следующее задание
+    берется из tasks, когда выдан результат, поэтому в памяти не весь
+    файл, а около ahead сжатых и разобранных блоков
+    """
+    pending = deque()
+    for task in tasks:
+        pending.append(pool.apply_async(func,(task,)))
+        if ( len(pending) >= ahead ):
+            yield pending.popleft().get()
+    while ( len(pending) > 0 ):
+        yield pending.popleft().get()
+
+def parsePbfFile(filename,osmTarget,kinds,jobs):
+    """
+    разбор OSM PBF файла с передачей элементов в osmTarget
+    блоки читаются по мере разбора, распаковываются и разбираются
+    в jobs процессах
+    """
+    logger.info("parsing PBF")
+    f=openOsmFile(filename)
+    tasks = readPbfTasks(f,kinds)
+    if (jobs > 1):
+        pool = multiprocessing.get_context("fork").Pool(jobs)
+        blocks = poolImap(pool, decodePbfBlock, tasks, 2*jobs)
+    else:
+        pool = None
+        blocks = map(decodePbfBlock, tasks)
+    for nodes, ways, rels in blocks:
+        for nodeid, lat, lon in zip(*nodes):
+            osmTarget.node(nodeid, lat, lon)
+        for wayid, refs in ways:
+            osmTarget.way(wayid, refs)
+        for relid, outer, inner in rels:
+            osmTarget.relation(relid, outer, inner)
+    f.close()
+    if pool:
+        pool.close()
+        pool.join()
+    osmTarget.close()
+    return osmTarget.count()
+
+def readOsmFile(filename,twopass=False,fmt="xml",jobs=1):
+    """
+    Чтение данных из файла формата OSM XML или OSM PBF
+    twopass - сначала прочитать отношения, затем только входящие в них
+    линии и точки
+    fmt - формат файла: "xml" или "pbf"
+    jobs - число процессов для разбора PBF
+    """
+    def parse(osmTarget,kinds):
+        if (fmt == "pbf"):
+            return parsePbfFile(filename,osmTarget,kinds,jobs)
+        return parseOsmFile(filename,osmTarget)
+    result=dict()
+    starttime=time.time()
+    if (twopass):
+        logger.info("read relations")
+        count=parse(OsmTarget(result,set(),set()),("rels",))
+        wantedways=set()
+        for t in ["outer","inner"]:
+            for r in result["rels"][t]:
+                wantedways.update(result["rels"][t][r])
+        logger.info("read ways")
+        count+=parse(OsmTarget(result,wantedways,set(),False),("ways",))
+        wantednodes=set()
+        for w in result["ways"]:
+            wantednodes.update(result["ways"][w])
+        logger.info("read nodes")
+        count+=parse(OsmTarget(result,set(),wantednodes,False),("nodes",))
+    else:
+        count=parse(OsmTarget(result),("nodes","ways","rels"))
+    result["nodes"].finish()
+    elapsed=max(time.time()-starttime,1e-6)
+    logger.info("parsed {} elements in {:.2f}s ({:.0f} elements/s)".format(
+        count,elapsed,count/elapsed))
     brokenways=[]
     for w in result["ways"]:
         for n in result["ways"][w]:
@@ -120,173 +688,690 @@ def readOsmFile(filename):
 
     return result
 
+OSM_CACHE_MAGIC = b"DCOSM1" + (b"LE" if sys.byteorder == "little" else b"BE")
+OSM_CACHE_HEADER = struct.Struct("<8s6q")
+
+def osmCacheFile(cachedir,filename):
+    """
+    имя файла кэша для входного файла
+    ключ - размер, время изменения и хэш начала и конца файла
+    """
+    st = os.stat(filename)
+    h = hashlib.sha1()
+    h.update("{}:{}:{}".format(os.path.abspath(filename),st.st_size,st.st_mtime_ns).encode())
+    with open(filename,"rb") as f:
+        h.update(f.read(1<<20))
+        f.seek(max(0,st.st_size-(1<<20)))
+        h.update(f.read(1<<20))
+    return os.path.join(cachedir,h.hexdigest()+".osmcache")
+
+def writeOsmCache(cachefile,osm):
+    """
+    запись прочитанных данных в двоичный кэш
+    все данные - плоские массивы int64/float64:
+    точки (id, lat, lon), линии (id, смещения, точки),
+    отношения (id, смещения outer, outer, смещения inner, inner)
+    """
+    nodes = osm["nodes"]
+    wayids = array("q", osm["ways"].keys())
+    wayoffsets = array("q", [0])
+    wayrefs = array("q")
+    for w in wayids:
+        wayrefs.extend(osm["ways"][w])
+        wayoffsets.append(len(wayrefs))
+    relids = array("q", osm["rels"]["outer"].keys())
+    members = dict()
+    for t in ["outer","inner"]:
+        members[t] = ( array("q", [0]), array("q") )
+        for r in relids:
+            members[t][1].extend(osm["rels"][t][r])
+            members[t][0].append(len(members[t][1]))
+    tmpfile = cachefile + ".tmp"
+    with open(tmpfile,"wb") as f:
+        f.write(OSM_CACHE_HEADER.pack(OSM_CACHE_MAGIC, len(nodes), len(wayids), len(wayrefs),
+            len(relids), len(members["outer"][1]), len(members["inner"][1])))
+        for a in [ nodes.ids, nodes.lats, nodes.lons, wayids, wayoffsets, wayrefs, relids,
+                members["outer"][0], members["outer"][1], members["inner"][0], members["inner"][1] ]:
+            f.write(a)
+    os.replace(tmpfile,cachefile)
+
+def readOsmCache(cachefile):
+    """
+    чтение двоичного кэша через mmap без копирования массивов
+    возвращает None, если кэш не подходит: пустой, чужой или обрезанный
+    файл (длина не совпадает с числами элементов из заголовка)
+    """
+    with open(cachefile,"rb") as f:
+        if ( os.fstat(f.fileno()).st_size < OSM_CACHE_HEADER.size ):
+            return None
+        mm = mmap.mmap(f.fileno(),0,access=mmap.ACCESS_READ)
+    magic, nnodes, nways, nrefs, nrels, nouter, ninner = OSM_CACHE_HEADER.unpack_from(mm)
+    counts = [ 3*nnodes, 2*nways+1, nrefs, 3*nrels+2, nouter, ninner ]
+    if ( magic != OSM_CACHE_MAGIC or min(nnodes, nways, nrefs, nrels, nouter, ninner) < 0
+            or len(mm) != OSM_CACHE_HEADER.size + 8*sum(counts) ):
+        mm.close()
+        return None
+    buf = memoryview(mm)
+    pos = [ OSM_CACHE_HEADER.size ]
+    def take(typecode,count):
+        a = buf[pos[0]:pos[0]+8*count].cast(typecode)
+        pos[0] += 8*count
+        return a
+    result = dict()
+    result["nodes"] = NodeStore(take("q",nnodes), take("d",nnodes), take("d",nnodes))
+    wayids = take("q",nways)
+    wayoffsets = take("q",nways+1)
+    wayrefs = take("q",nrefs)
+    result["ways"] = { wayids[i]: wayrefs[wayoffsets[i]:wayoffsets[i+1]] for i in range(nways) }
+    relids = take("q",nrels)
+    result["rels"] = dict()
+    for t, count in [ ("outer",nouter), ("inner",ninner) ]:
+        offsets = take("q",nrels+1)
+        refs = take("q",count)
+        result["rels"][t] = { relids[i]: refs[offsets[i]:offsets[i+1]] for i in range(nrels) }
+    logger.info("rels: {0}, ways: {1}, nodes: {2}".format(nrels,nways,nnodes))
+    return result
+
 def mergeWays(ways_to_merge):
     """
-    объединяет линии в кольцо, или же выдает исключение, если это невозможно
-    кольцо должно быть без самопересечений
-    если колец несколько, берется наибольшее по площади
+    объединяет линии в кольца, или же выдает исключение, если это невозможно
+    кольца должны быть без самопересечений
+    линии соединяются по индексу концевых точек за линейное время
 
     ways_to_merge - id линий, которые объединяем
-    выход - ( <список точек, входящих в кольцо>, <площадь в кв. метрах> )
+    выход - ( <список колец из точек>, <суммарная площадь в кв. метрах> )
     """
     ways=osm["ways"]
     ends = defaultdict(list)
-    firstnode = None
     for way_id in ways_to_merge:
-        for node_id in [ ways[way_id][0], ways[way_id][-1] ] :
-            if (firstnode == None):
-                firstnode = node_id
-            ends[node_id].append(way_id)
-    w = None
-    rings = []
-    ring = []
-    n = firstnode
-    node_count = 0
-    while ( len(ends) > 0 ):
-        if ( len(ends[n]) > 2 or (len(ends[n]) == 1 and w != ends[n][0]) ):
+        ends[ways[way_id][0]].append(way_id)
+        ends[ways[way_id][-1]].append(way_id)
+    for node_id in ends:
+        if ( len(ends[node_id]) != 2 ):
             raise BadRingException("Can't merge ways into ring (selfintersections?)")
-        if ( len(ends[n]) == 1 ):
-            #ring is closed, start new one (if possible)
-            w = None
-            del ends[n]
-            rings.append(ring)
-            ring = []
-            if ( len(ends) > 0 ):
-                n = list(ends.keys())[0]
-                logger.warning("using only biggest ring")
+    used = set()
+    rings = []
+    for start in ways_to_merge:
+        if ( start in used ):
             continue
-        if ( w == ends[n][0] ):
-            w = ends[n][1]
-            del ends[n]
-        elif ( w == ends[n][1] ):
-            w = ends[n][0]
-            del ends[n]
-        elif ( w == None ):
-            w = ends[n].pop()
-        else:
-            raise BadRingException("Can't merge ways into ring (something went wrong)")
-        way = ways[w][:]
-        if ( way[0] != n ):
-            way.reverse()
-        ring += way[1:]
-        n = way[-1]
-    maxarea = 0
-    biggestring = None
+        # сначала собираем линии кольца с направлением обхода,
+        # затем один раз копируем точки в массив кольца
+        segments = []
+        size = 0
+        w = start
+        firstnode = n = ways[w][0]
+        while True:
+            used.add(w)
+            way = ways[w]
+            forward = ( way[0] == n )
+            segments.append(( w, forward ))
+            size += len(way) - 1
+            n = way[-1] if forward else way[0]
+            if ( n == firstnode ):
+                break
+            w = ends[n][1] if ends[n][0] == w else ends[n][0]
+            if ( w in used ):
+                raise BadRingException("Can't merge ways into ring (something went wrong)")
+        ring = array("q", [0]) * size
+        view = memoryview(ring)
+        pos = 0
+        for w, forward in segments:
+            way = memoryview(ways[w])
+            view[pos:pos+len(way)-1] = way[1:] if forward else way[-2::-1]
+            pos += len(way) - 1
+        rings.append(ring)
+    totalarea = 0
     for ring in rings:
         area = calcShapeArea(ring)
-        if area > maxarea:
-            maxarea = area
-            biggestring = ring
+        totalarea += area
         logger.debug("area: {:15.2f} points: {:5}".format(area,len(ring)))
-    return (biggestring, maxarea)
+    return (rings, totalarea)
 
-def geopoint(lat,lon): 
-    """
-    возвращает пару координат в виде dictionary {lat,lon}
-    """
-    return {'lat': lat, 'lon': lon}
+# с какого числа точек кольца площадь выгоднее считать через numpy
+AREA_ARRAY_MIN_POINTS = 32
+# ребра короче (м) считаются по формулам коротких линий без итераций,
+# относительная ошибка площади кольца ~1e-11
+SHORT_EDGE_LENGTH = 1000
 
 def calcShapeArea(shape):
     """
     расчет площади выпуклого геомногоугольника
+    если есть numpy, ребра больших колец считаются одним векторным вызовом
+    area_method "authalic" и "lambert" - быстрые приближенные способы
+    """
+    if ( area_method == "authalic" ):
+        return calcAuthalicArea(shape)
+    if ( area_method == "lambert" ):
+        return calcLambertArea(shape)
+    nodes = osm["nodes"]
+    if ( numpy is not None and len(shape) >= AREA_ARRAY_MIN_POINTS ):
+        lats, lons = nodes.coords(shape)
+        return abs(Geodesic.WGS84.AreaArray(lats, lons, shortlen=SHORT_EDGE_LENGTH)["area"])
+    coords = map(nodes.__getitem__, shape)
+    return abs(Geodesic.WGS84.AreaPoints(coords, shortlen=SHORT_EDGE_LENGTH)["area"])
+
+# эксцентриситет WGS84 и радиус сферы той же площади (аутентической)
+WGS84_E = math.sqrt(Constants.WGS84_f*(2-Constants.WGS84_f))
+
+def authalicQ(sinlat):
+    """
+    q(широта) для перехода к аутентической широте: sin(ξ) = q / AUTHALIC_QP
+    """
+    e = WGS84_E
+    return (1-e*e)*( sinlat/(1-e*e*sinlat*sinlat) + numpy.arctanh(e*sinlat)/e )
+
+AUTHALIC_QP = 1 + (1-WGS84_E**2)*math.atanh(WGS84_E)/WGS84_E
+AUTHALIC_R2 = Constants.WGS84_a**2*AUTHALIC_QP/2
+
+def authalicCoords(shape):
+    """
+    аутентические широты и долготы точек кольца в радианах
+    долготы идут без скачка через 180°, чтобы кольцо было непрерывным
+    """
+    lats, lons = osm["nodes"].coords(shape)
+    xi = numpy.arcsin(numpy.clip(authalicQ(numpy.sin(numpy.radians(lats)))/AUTHALIC_QP, -1, 1))
+    dlon = numpy.diff(lons)
+    dlon = ( dlon + 180 ) % 360 - 180
+    lam = numpy.radians(lons[0] + numpy.concatenate(( [0], numpy.cumsum(dlon) )))
+    return ( xi, lam )
+
+def calcAuthalicArea(shape):
+    """
+    площадь кольца как сферического многоугольника на аутентической сфере
+    (сферический избыток, ребра - дуги больших кругов)
+    """
+    xi, lam = authalicCoords(shape)
+    t1 = numpy.tan(xi/2)
+    t2 = numpy.roll(t1,-1)
+    dlam = numpy.roll(lam,-1) - lam
+    excess = 2*numpy.arctan2(numpy.tan(dlam/2)*(t1+t2), 1+t1*t2)
+    return abs(math.fsum(excess))*AUTHALIC_R2
+
+def calcLambertArea(shape):
     """
-    poly = [ geopoint( float(osm["nodes"][i][0]), float(osm["nodes"][i][1]) )  for i in shape ]
-    area = abs(Geodesic.WGS84.Area(poly)["area"])
-    return area
+    площадь кольца в равновеликой азимутальной проекции Ламберта с центром
+    в середине кольца (формула шнурков)
+    """
+    xi, lam = authalicCoords(shape)
+    xi0 = xi.mean()
+    dlam = lam - lam.mean()
+    k = numpy.sqrt(2/(1 + math.sin(xi0)*numpy.sin(xi) + math.cos(xi0)*numpy.cos(xi)*numpy.cos(dlam)))
+    x = k*numpy.cos(xi)*numpy.sin(dlam)
+    y = k*( math.cos(xi0)*numpy.sin(xi) - math.sin(xi0)*numpy.cos(xi)*numpy.cos(dlam) )
+    return abs(math.fsum(x*numpy.roll(y,-1) - numpy.roll(x,-1)*y))/2*AUTHALIC_R2
+
+RINGS_CACHE_VERSION = 4
+
+def shapeKey(ways_to_merge):
+    """
+    хэш геометрии отношения: id линий, id и координаты их точек
+    """
+    ways=osm["ways"]
+    nodes=osm["nodes"]
+    h = hashlib.sha1(array("q",ways_to_merge))
+    for w in ways_to_merge:
+        coords = array("d")
+        for n in ways[w]:
+            coords.extend(nodes[n])
+        h.update(array("q",ways[w]))
+        h.update(coords)
+    return h.digest()
+
+def mergeRelation(relid):
+    """
+    кольца и площадь одного отношения
+    в процессах пула данные osm доступны без копирования (fork)
+    """
+    return mergeWays(osm["rels"]["outer"][relid])
+
+def mergeShapes(cachefile=None,jobs=1):
+    """
+    объединение линий в кольца и расчет площадей всех отношений
+    cachefile - файл кэша колец и площадей, пересчитываются только
+    отношения, геометрия которых изменилась (None - без кэша)
+    jobs - число процессов для объединения линий и расчета площадей
+    """
+    cache = dict()
+    if ( cachefile and os.path.exists(cachefile) ):
+        with open(cachefile,"rb") as f:
+            cache = pickle.load(f)
+        if ( cache.get("version") != RINGS_CACHE_VERSION or cache.get("method") != area_method ):
+            cache = dict()
+        cache = cache.get("rings",dict())
+    keys = dict()
+    todo = []
+    for k in osm["rels"]["outer"]:
+        keys[k] = shapeKey(osm["rels"]["outer"][k]) if cachefile else None
+        if not ( k in cache and cache[k][0] == keys[k] ):
+            todo.append(k)
+    if ( jobs > 1 and len(todo) > 1 ):
+        pool = multiprocessing.get_context("fork").Pool(jobs)
+        merged = dict(zip(todo, pool.imap(mergeRelation, todo, len(todo)//(4*jobs)+1)))
+        pool.close()
+        pool.join()
+    else:
+        merged = { k: mergeRelation(k) for k in todo }
+    newcache = dict()
+    for k in osm["rels"]["outer"]:
+        logger.debug(k)
+        ( shapes[k], shapes_areas[k] ) = merged[k] if k in merged else cache[k][1:]
+        newcache[k] = ( keys[k], shapes[k], shapes_areas[k] )
+        logger.debug("area {:10} {:10.2f} km2".format(k,shapes_areas[k]/1000000))
+    if cachefile:
+        logger.info("rings from cache: {}, merged: {}".format(len(newcache)-len(merged),len(merged)))
+        with open(cachefile+".tmp","wb") as f:
+            pickle.dump({ "version": RINGS_CACHE_VERSION, "method": area_method, "rings": newcache },f,pickle.HIGHEST_PROTOCOL)
+        os.replace(cachefile+".tmp",cachefile)
+
+# средний радиус WGS84 для длин границ
+MEAN_RADIUS = Constants.WGS84_a*(1-Constants.WGS84_f/3)
+
+def waysLengths(wayids):
+    """
+    длины линий в метрах по дугам большого круга на сфере среднего
+    радиуса (ошибка до 0.6%, для весов ребер графа этого достаточно)
+    возвращает список длин в порядке wayids
+    """
+    nodes = osm["nodes"]
+    ways = osm["ways"]
+    if ( numpy is not None and len(wayids) > 0 ):
+        lats, lons = nodes.coords(numpy.concatenate([ ways[w] for w in wayids ]))
+        phi = numpy.radians(lats)
+        h = ( numpy.sin(numpy.diff(phi)/2)**2 +
+              numpy.cos(phi[:-1])*numpy.cos(phi[1:])*numpy.sin(numpy.radians(numpy.diff(lons))/2)**2 )
+        d = numpy.append(2*MEAN_RADIUS*numpy.arcsin(numpy.sqrt(numpy.clip(h,0,1))), 0)
+        # отрезок от последней точки линии к первой точке следующей не входит
+        sizes = numpy.asarray([ len(ways[w]) for w in wayids ])
+        ends = numpy.cumsum(sizes)
+        d[ends-1] = 0
+        return numpy.add.reduceat(d, ends-sizes).tolist()
+    result = []
+    for w in wayids:
+        length = 0
+        lat1, lon1 = nodes[ways[w][0]]
+        for n in ways[w][1:]:
+            lat2, lon2 = nodes[n]
+            h = ( math.sin(math.radians(lat2-lat1)/2)**2 +
+                  math.cos(math.radians(lat1))*math.cos(math.radians(lat2))*math.sin(math.radians(lon2-lon1)/2)**2 )
+            length += 2*MEAN_RADIUS*math.asin(math.sqrt(min(h,1)))
+            lat1, lon1 = lat2, lon2
+        result.append(length)
+    return result
+
+def sharedBorders(shapesids):
+    """
+    общие границы областей: линия из 2 и более точек во внешних кольцах
+    двух отношений - их общая граница
+    возвращает border[s1][s2] - длина общей границы в метрах, s1 < s2
+    """
+    wayrels = defaultdict(list)
+    for s in shapesids:
+        for w in osm["rels"]["outer"][s]:
+            wayrels[w].append(s)
+    shared = [ w for w in wayrels if len(wayrels[w]) > 1 and len(osm["ways"][w]) > 1 ]
+    border = defaultdict(dict)
+    for w, length in zip(shared, waysLengths(shared)):
+        rels = wayrels[w]
+        for i in range(0,len(rels)-1):
+            for j in range(i+1,len(rels)):
+                s1 = min(rels[i], rels[j])
+                s2 = max(rels[i], rels[j])
+                if ( s1 != s2 ):
+                    border[s1][s2] = border[s1].get(s2,0) + length
+    return border
 
 def createGraph(shapesids):
     """
     создание графа соседних областей
     узел - область
-    ребро - к соседней области
-    области считаются соседними, если имеют 2 или более общих точки
+    ребро - к соседней области, вес ребра - длина общей границы в метрах
+    G[s1][s2] - длина границы s1 и s2
+    области считаются соседними, если имеют общую линию
     """
-    pointinshape = defaultdict(list)
-    for s in shapesids:
-        for p in shapes[s]:
-            pointinshape[p].append(s)
-    sharepoints = defaultdict(dict)
-    for p in pointinshape:
-        for i in range(0,len(pointinshape[p])-1):
-            for j in range(i+1,len(pointinshape[p])):
-                s1 = min(pointinshape[p][i], pointinshape[p][j])
-                s2 = max(pointinshape[p][i], pointinshape[p][j])
-                sharepoints[s1][s2] = sharepoints[s1].setdefault(s2,0) + 1;
+    border = sharedBorders(shapesids)
     G = OrderedDict()
-    for s1 in sorted(sharepoints.keys()):
-        for s2 in sorted(sharepoints[s1].keys()):
-            if ( sharepoints[s1][s2] > 1 ):
-                if not s1 in G:
-                    G[s1] = []
-                if not s2 in G:
-                    G[s2] = []
-                G[s1].append(s2)
-                G[s2].append(s1)
+    for s1 in sorted(border.keys()):
+        for s2 in sorted(border[s1].keys()):
+            if not s1 in G:
+                G[s1] = dict()
+            if not s2 in G:
+                G[s2] = dict()
+            G[s1][s2] = border[s1][s2]
+            G[s2][s1] = border[s1][s2]
     return G
 
-def getFarthestPoint(G,pointid):
+def numpyArray(typecode, a):
     """
-    поиск точки наиболее удаленной от точки point
-    в графе G
+    копия массива numpy в array.array с элементами типа typecode
     """
+    result = array(typecode)
+    result.frombytes(a.astype(typecode).tobytes())
+    return result
+
+class Graph:
+    """
+    граф соседних областей в компактном виде (CSR) для обходов
+    вершины - индексы 0..n-1 областей ids, соседи вершины i -
+    indices[indptr[i]:indptr[i+1]] по возрастанию индекса,
+    длины общих границ - weights в том же порядке, площади - areas[i]
+    области упорядочены по строкам id, как в версии с текстовыми id:
+    от этого порядка зависят начальная вершина, порядок обходов и
+    списков частей, поэтому разбиение не меняется при разной длине id
+    поиск по id - через sortedids (по возрастанию) и positions
+    """
+
+    def __init__(self, G=None, shapesids=()):
+        """
+        G - граф из createGraph, G[s1][s2] - длина границы (None - пустой граф)
+        shapesids - области без соседей, которые тоже нужны в графе
+        """
+        self.ids = array("q", sorted(set(G or ()).union(shapesids), key=str))
+        self.sortIds()
+        rows = [ G.get(s,{}) for s in self.ids ]
+        self.indptr = array("q", [0])
+        self.indptr.extend(accumulate(map(len, rows)))
+        if ( numpy is not None ):
+            neighbors = array("q", chain.from_iterable(rows))
+            weights = array("d", chain.from_iterable(map(dict.values, rows)))
+            indices = numpy.frombuffer(self.positions, dtype=numpy.int64)[
+                numpy.searchsorted(numpy.frombuffer(self.sortedids, dtype=numpy.int64),
+                    numpy.frombuffer(neighbors, dtype=numpy.int64))]
+            rowof = numpy.repeat(numpy.arange(len(rows)), numpy.diff(numpy.frombuffer(self.indptr, dtype=numpy.int64)))
+            order = numpy.lexsort((indices, rowof))
+            self.indices = numpyArray("q", indices[order])
+            self.weights = numpyArray("d", numpy.frombuffer(weights)[order])
+        else:
+            index = { s: i for i, s in enumerate(self.ids) }
+            edges = []
+            for row in rows:
+                edges.extend(sorted(zip(map(index.__getitem__, row), row.values())))
+            self.indices = array("q", [ e[0] for e in edges ])
+            self.weights = array("d", [ e[1] for e in edges ])
+        self.areas = array("d", map(shapes_areas.__getitem__, self.ids))
+
+    def sortIds(self):
+        """
+        sortedids - ids по возрастанию, positions - их индексы в ids
+        """
+        order = sorted(range(len(self.ids)), key=self.ids.__getitem__)
+        self.sortedids = array("q", map(self.ids.__getitem__, order))
+        self.positions = array("q", order)
+
+    def subgraph(self, shapesids):
+        """
+        индуцированный подграф областей shapesids - то же, что
+        Graph(createGraph(shapesids)), но без повторного построения:
+        вершины - области, у которых есть соседи среди shapesids
+        время - O(число областей и их ребер), а не O(размер графа)
+        """
+        indptr = self.indptr
+        indices = self.indices
+        sub = Graph()
+        if ( numpy is not None ):
+            ids = numpy.frombuffer(self.ids, dtype=numpy.int64)
+            sortedids = numpy.frombuffer(self.sortedids, dtype=numpy.int64)
+            want = numpy.asarray(list(shapesids), dtype=numpy.int64)
+            members = numpy.searchsorted(sortedids, want)
+            found = members < len(ids)
+            found[found] = sortedids[members[found]] == want[found]
+            members = numpy.unique(numpy.frombuffer(self.positions, dtype=numpy.int64)[members[found]])
+            inside = numpy.zeros(len(ids), dtype=bool)
+            inside[members] = True
+            starts = numpy.frombuffer(indptr, dtype=numpy.int64)[members]
+            counts = numpy.frombuffer(indptr, dtype=numpy.int64)[members+1] - starts
+            # номера ребер вершин members подряд и номера их строк
+            edges = numpy.repeat(starts - numpy.cumsum(counts) + counts, counts) + numpy.arange(counts.sum())
+            rows = numpy.repeat(numpy.arange(len(members)), counts)
+            neighbors = numpy.frombuffer(indices, dtype=numpy.int64)[edges]
+            inner = inside[neighbors]
+            edges, rows, neighbors = edges[inner], rows[inner], neighbors[inner]
+            degree = numpy.bincount(rows, minlength=len(members))
+            keep = members[degree > 0]
+            newindex = numpy.zeros(len(self.ids), dtype=numpy.int64)
+            newindex[keep] = numpy.arange(len(keep))
+            sub.ids = numpyArray("q", ids[keep])
+            sub.indptr.extend(numpyArray("q", numpy.cumsum(degree[degree > 0])))
+            sub.indices = numpyArray("q", newindex[neighbors])
+            sub.weights = numpyArray("d", numpy.frombuffer(self.weights)[edges])
+            sub.areas = numpyArray("d", numpy.frombuffer(self.areas)[keep])
+            sub.sortIds()
+            return sub
+        members = sorted(set(i for i in map(self.index, shapesids) if i >= 0))
+        inside = bytearray(len(self.ids))
+        for i in members:
+            inside[i] = 1
+        # номера ребер в indices/weights, идущих внутрь подграфа
+        keep = []
+        rows = []
+        for i in members:
+            row = [ k for k in range(indptr[i],indptr[i+1]) if inside[indices[k]] ]
+            if ( len(row) > 0 ):
+                keep.append(i)
+                rows.append(row)
+        newindex = dict(zip(keep, range(len(keep))))
+        edges = list(chain.from_iterable(rows))
+        sub.ids = array("q", map(self.ids.__getitem__, keep))
+        sub.indptr.extend(accumulate(map(len, rows)))
+        sub.indices = array("q", [ newindex[indices[k]] for k in edges ])
+        sub.weights = array("d", map(self.weights.__getitem__, edges))
+        sub.areas = array("d", map(self.areas.__getitem__, keep))
+        sub.sortIds()
+        return sub
+
+    def index(self, shapeid):
+        """
+        индекс вершины области или -1, если ее нет в графе
+        """
+        i = bisect_left(self.sortedids, shapeid)
+        if ( i < len(self.sortedids) and self.sortedids[i] == shapeid ):
+            return self.positions[i]
+        return -1
+
+    def __len__(self):
+        return len(self.ids)
+
+def getFarthestPoint(graph,pointid):
+    """
+    поиск вершины наиболее удаленной от вершины pointid
+    в графе graph
+    """
+    indptr = graph.indptr
+    indices = graph.indices
     startpoint = pointid
-    bfs = dict()
+    bfs = bytearray(len(graph))
     bfs[startpoint] = 1
     Q = deque()
     Q.append(startpoint)
     lastpoint = startpoint
     while ( len(Q) > 0 ):
         p = Q.popleft()
-        for n in G[p]:
-            if not n in bfs:
+        for n in indices[indptr[p]:indptr[p+1]]:
+            if not bfs[n]:
                 bfs[n] = 1
                 Q.append(n)
         lastpoint = p
     return lastpoint
 
-def bfsMarkParts(G,bfs,startpoints):
-    """
-    маркирует части графа
-    """
-    Q = [ deque(), deque() ]
-    area = [0,0]
-    for p in range(0,2):
-        Q[p].append(startpoints[p])
-        area[p] = shapes_areas[startpoints[p]]
-    while( len(Q[0]) > 0 or len(Q[1]) > 0 ):
-        part_id =  1 
-        if ( ( area[0] < area[1] and len(Q[0]) > 0 ) 
-                or len(Q[1]) == 0  ):
-            part_id = 0
-        apart_id = abs(part_id - 1)
+def getSeeds(graph,k):
+    """
+    k удаленных друг от друга вершин графа для выращивания частей
+    первая - как при делении пополам, каждая следующая - самая удаленная
+    (по числу ребер) от уже выбранных; расстояния до ближайшей выбранной
+    вершины уточняются обходом в ширину только там, где они уменьшаются
+    если вершин не хватает, возвращается меньше k вершин
+    """
+    indptr = graph.indptr
+    indices = graph.indices
+    unreached = len(graph)
+    dist = [unreached]*len(graph)
+    buckets = defaultdict(set)    # расстояние -> вершины (кроме выбранных)
+    top = 0
+    seeds = []
+    s = getFarthestPoint(graph,0)
+    while True:
+        seeds.append(s)
+        buckets[dist[s]].discard(s)
+        dist[s] = 0
+        Q = deque([ s ])
+        while ( len(Q) > 0 ):
+            p = Q.popleft()
+            d = dist[p] + 1
+            for n in indices[indptr[p]:indptr[p+1]]:
+                if ( d < dist[n] ):
+                    buckets[dist[n]].discard(n)
+                    dist[n] = d
+                    buckets[d].add(n)
+                    Q.append(n)
+                    top = max(top, d)
+        if ( len(seeds) >= k ):
+            break
+        # расстояния только уменьшаются, поэтому top не растет
+        while ( top > 0 and len(buckets[top]) == 0 ):
+            top -= 1
+        if ( top == 0 ):
+            logger.warning("only {} parts can be grown".format(len(seeds)))
+            break
+        s = min(buckets[top])
+    return seeds
+
+def bfsMarkParts(graph,bfs,startpoints):
+    """
+    маркирует части графа, части растут одновременно из startpoints:
+    очередную вершину получает часть с наименьшей площадью
+    (при равенстве - с большим номером)
+    bfs[i] - номер части вершины i, -1 - не размечена
+    """
+    indptr = graph.indptr
+    indices = graph.indices
+    areas = graph.areas
+    ids = graph.ids
+    debug = logger.isEnabledFor(logging.DEBUG)
+    Q = [ deque([ p ]) for p in startpoints ]
+    area = [ areas[p] for p in startpoints ]
+    # части с непустой очередью: ( площадь, -номер )
+    heap = [ ( area[i], -i ) for i in range(len(startpoints)) ]
+    heapq.heapify(heap)
+    while( len(heap) > 0 ):
+        part_id = -heapq.heappop(heap)[1]
         p = Q[part_id].popleft()
-        part_id = bfs[p]
-        logger.debug("part {} p {} areapart {}".format(part_id,p,area[part_id]))
-        for n in G[p]:
-            if ( n in bfs ): 
+        if debug:
+            logger.debug("part {} p {} areapart {}".format(part_id,ids[p],area[part_id]))
+        for n in indices[indptr[p]:indptr[p+1]]:
+            if ( bfs[n] >= 0 ): 
                 continue
             bfs[n] = part_id
-            area[part_id] += shapes_areas[n]
+            area[part_id] += areas[n]
             Q[part_id].append(n)
-            logger.debug("part {} n {} arean {}".format(part_id,n,shapes_areas[n]))
-            if (area[part_id] > area[apart_id] and len(Q[apart_id]) > 0):
+            if debug:
+                logger.debug("part {} n {} arean {}".format(part_id,ids[n],areas[n]))
+            if ( len(heap) > 0 and area[part_id] > heap[0][0] ):
                 Q[part_id].appendleft(p) #put the same place we've taken it from
                 break
+        if ( len(Q[part_id]) > 0 ):
+            heapq.heappush(heap, ( area[part_id], -part_id ))
     logger.debug("areas: {}".format(area))
     return
 
-def divideGraph(G,p1,p2):
+def markParts(graph,startpoints):
+    """
+    разметка частей, растущих из вершин startpoints
+    возвращает bfs: bfs[i] - номер части вершины i, -1 - не размечена
+    """
+    bfs = [-1]*len(graph)
+    for i in range(len(startpoints)):
+        bfs[startpoints[i]] = i
+    bfsMarkParts(graph,bfs,startpoints)
+    return bfs
+
+def partsLists(graph,bfs,k):
+    """
+    списки идентификаторов k частей по разметке bfs
     """
-    делит граф G на две примерно равные по площади связные части
-    построение частей начинается с точек p1 и p2
+    result = [ [] for p in range(k) ]
+    for i in range(len(graph)):
+        if ( bfs[i] >= 0 ):
+            result[bfs[i]].append(graph.ids[i])
+    return result
+
+def divideGraph(graph,startpoints):
+    """
+    делит граф на len(startpoints) примерно равных по площади связных частей
+    построение частей начинается с вершин startpoints
+    возвращает массив списков из идентификаторов полученных частей
+    """
+    return partsLists(graph,markParts(graph,startpoints),len(startpoints))
+
+# до какого отношения наибольшей и наименьшей площадей частей переносятся
+# семена при выращивании k частей, остальное выравнивает refineParts
+GROW_RATIO = 1.3
+GROW_STALE = 3
+
+def growParts(graph,k):
+    """
+    деление графа на k примерно равных по площади связных частей:
+    части растут одновременно из вершин getSeeds, затем семя наименьшей
+    части переносится в самую удаленную от семени вершину наибольшей, и
+    части выращиваются заново, пока площади различаются больше чем в
+    GROW_RATIO раз и разбиение улучшается (GROW_STALE попыток без улучшения
+    подряд, не больше k попыток), берется лучшее из разбиений
     возвращает массив списков из идентификаторов полученных частей
     """
-    bfs = {p1:0, p2:1}
-    bfsMarkParts(G,bfs,[p1,p2])
-    result = [[],[]]
-    for s in bfs:
-        result[bfs[s]].append(s)
-    return [ sorted(result[0]), sorted(result[1]) ]
+    indptr = graph.indptr
+    indices = graph.indices
+    areas = graph.areas
+    seeds = getSeeds(graph,k)
+    best = None
+    for attempt in range(len(seeds)):
+        bfs = markParts(graph,seeds)
+        area = [0.0]*len(seeds)
+        for i in range(len(graph)):
+            if ( bfs[i] >= 0 ):
+                area[bfs[i]] += areas[i]
+        small = min(range(len(seeds)), key=area.__getitem__)
+        big = max(range(len(seeds)), key=area.__getitem__)
+        ratio = area[big] / area[small] if area[small] > 0 else float("inf")
+        logger.debug("seeds attempt {} ratio {}".format(attempt,ratio))
+        if ( best == None or ratio < best[0] ):
+            best = ( ratio, bfs )
+            stale = 0
+        else:
+            stale += 1
+        if ( ratio < GROW_RATIO or stale >= GROW_STALE ):
+            break
+        # самая удаленная от семени вершина наибольшей части
+        visited = { seeds[big] }
+        Q = deque([ seeds[big] ])
+        while ( len(Q) > 0 ):
+            p = Q.popleft()
+            for n in indices[indptr[p]:indptr[p+1]]:
+                if ( bfs[n] == big and not n in visited ):
+                    visited.add(n)
+                    Q.append(n)
+        if ( p == seeds[big] ):
+            # наибольшая часть - одна область, делить ее нечем
+            break
+        seeds[small] = p
+    return partsLists(graph,best[1],len(seeds))
+
+def dividePart(part):
+    """
+    деление части part пополам по графу graph всех областей
+    в процессах пула граф доступен без копирования (fork)
+    возвращает список частей: две половины или саму part, если ее
+    нельзя делить
+    """
+    if ( len(part) < 2 ):
+        return [ part ]
+    logger.debug("number of shapes: {}".format(len(part)))
+    subgraph = graph.subgraph(part)
+    logger.debug("graph size: {}".format(len(subgraph)))
+    if ( len(subgraph) == 0 ):
+        # нет соседних областей - делить нечего
+        return [ part ]
+    s1 = getFarthestPoint(subgraph,0)
+    s2 = getFarthestPoint(subgraph,s1)
+    logger.info("divide graph")
+    return divideGraph(subgraph,[s1,s2])
 
 def getNestedShapes():
     """
@@ -316,6 +1401,352 @@ def getNestedShapes():
                 result[so].append(si)  # outer way belongs to the inner shape
     return result
 
+def readOscFile(filename):
+    """
+    Чтение файла изменений osmChange
+    """
+    changes=dict()
+    parser=etree.XMLParser(target=OscTarget(changes));
+    f=openOsmFile(filename);
+    etree.parse(f,parser);
+    f.close();
+    return changes
+
+def saveState(filename,G,parts):
+    """
+    сохранение состояния для последующего запуска с файлом изменений:
+    данные OSM, кольца, площади, граф соседних областей и разбиение
+    """
+    nodes = osm["nodes"]
+    state = {
+        "nodes": ( array("q",bytes(nodes.ids)), array("d",bytes(nodes.lats)), array("d",bytes(nodes.lons)) ),
+        "ways": { w: array("q",osm["ways"][w]) for w in osm["ways"] },
+        "rels": { t: { r: list(osm["rels"][t][r]) for r in osm["rels"][t] } for t in ["outer","inner"] },
+        "shapes": shapes,
+        "shapes_areas": shapes_areas,
+        "area_method": area_method,
+        "graph": G,
+        "parts": parts
+    }
+    with open(filename+".tmp","wb") as f:
+        pickle.dump(state,f,pickle.HIGHEST_PROTOCOL)
+    os.replace(filename+".tmp",filename)
+
+def loadState(filename):
+    """
+    чтение сохраненного состояния
+    возвращает ( граф соседних областей, разбиение )
+    """
+    global osm, area_method
+    with open(filename,"rb") as f:
+        state = pickle.load(f)
+    area_method = state.get("area_method","geodesic")
+    osm = { "nodes": NodeStore(*state["nodes"]), "ways": state["ways"], "rels": state["rels"] }
+    shapes.update(state["shapes"])
+    shapes_areas.update(state["shapes_areas"])
+    G = state["graph"]
+    if ( any(isinstance(G[s],list) for s in G) ):
+        # состояние старой версии: граф без длин границ
+        G = createGraph(list(shapes.keys()))
+    return ( G, state["parts"] )
+
+def getWayRels():
+    """
+    индекс линия -> отношения, в которые она входит как outer
+    """
+    wayrels = defaultdict(list)
+    for r in osm["rels"]["outer"]:
+        for w in osm["rels"]["outer"][r]:
+            wayrels[w].append(r)
+    return wayrels
+
+def applyChanges(changes):
+    """
+    применение изменений osmChange к данным OSM
+    изменения учитываются только для отношений, их линий и точек
+    возвращает множество отношений, геометрия которых изменилась
+    """
+    nodes = osm["nodes"]
+    ways = osm["ways"]
+    rels = osm["rels"]
+    affected = set()
+    for r, members in changes["rels"].items():
+        if ( members is None ):
+            if ( r not in rels["outer"] ):
+                continue
+            del rels["outer"][r]
+            del rels["inner"][r]
+        else:
+            ( rels["outer"][r], rels["inner"][r] ) = members
+        affected.add(r)
+    wanted = set()
+    for t in ["outer","inner"]:
+        for r in rels[t]:
+            wanted.update(rels[t][r])
+    changedways = set()
+    newrefs = set()
+    for w, refs in changes["ways"].items():
+        if ( w not in ways and w not in wanted ):
+            continue
+        if ( refs is None ):
+            ways.pop(w,None)
+        else:
+            ways[w] = refs
+            newrefs.update(refs)
+        changedways.add(w)
+    nodechanges = { n: c for n, c in changes["nodes"].items() if n in nodes or n in newrefs }
+    nodes.update(nodechanges)
+    if nodechanges:
+        for w in ways:
+            if not nodechanges.keys().isdisjoint(ways[w]):
+                changedways.add(w)
+    wayrels = getWayRels()
+    for w in changedways:
+        affected.update(wayrels[w])
+    # в состоянии есть только линии и точки, прочитанные при полном
+    # запуске: без линий отношений, не попавших в --two-pass, и без
+    # линий отношений, сломанных при чтении; полный запуск с такими
+    # изменениями может включить отношение, здесь оно удаляется
+    for r in affected:
+        if ( r not in rels["outer"] ):
+            continue
+        missing = [ w for w in rels["outer"][r] if w not in ways ]
+        incomplete = [ w for w in rels["outer"][r]
+            if w in ways and not all(n in nodes for n in ways[w]) ]
+        if ( missing or incomplete ):
+            logger.warning("relation {} dropped, not in the state: ways [{}], nodes of ways [{}]; "
+                "a full run is needed to include it".format(r,
+                ", ".join(map(str,missing)), ", ".join(map(str,incomplete))))
+            del rels["outer"][r]
+            del rels["inner"][r]
+    logger.info("changed relations: {}".format(len(affected)))
+    return affected
+
+def updateShapes(affected):
+    """
+    пересчет колец и площадей измененных отношений
+    """
+    for r in affected:
+        if ( r in osm["rels"]["outer"] ):
+            ( shapes[r], shapes_areas[r] ) = mergeWays(osm["rels"]["outer"][r])
+        else:
+            shapes.pop(r,None)
+            shapes_areas.pop(r,None)
+
+def updateGraph(G,affected):
+    """
+    обновление ребер графа соседних областей для измененных отношений
+    кандидаты в соседи - прежние соседи и отношения с общими линиями,
+    соседи - отношения с общей линией из 2 и более точек
+    """
+    wayrels = getWayRels()
+    candidates = defaultdict(set)
+    for s in affected:
+        candidates[s].update(G.get(s,{}))
+        for n in G.pop(s,{}):
+            del G[n][s]
+            if ( len(G[n]) == 0 ):
+                del G[n]
+        if ( s in shapes ):
+            for w in osm["rels"]["outer"][s]:
+                candidates[s].update(wayrels[w])
+    for s in affected:
+        if ( s not in shapes ):
+            continue
+        ways = set(osm["rels"]["outer"][s])
+        for n in sorted(candidates[s]):
+            if ( n == s or n not in shapes or n in G.get(s,{}) ):
+                continue
+            shared = [ w for w in ways.intersection(osm["rels"]["outer"][n]) if len(osm["ways"][w]) > 1 ]
+            if ( len(shared) > 0 ):
+                length = sum(waysLengths(sorted(shared)))
+                G.setdefault(s,dict())[n] = length
+                G.setdefault(n,dict())[s] = length
+
+def isConnected(graph,members):
+    """
+    проверка связности части members (индексы вершин)
+    """
+    indptr = graph.indptr
+    indices = graph.indices
+    start = min(members)
+    bfs = { start }
+    Q = deque([ start ])
+    while ( len(Q) > 0 ):
+        p = Q.popleft()
+        for n in indices[indptr[p]:indptr[p+1]]:
+            if ( n in members and not n in bfs ):
+                bfs.add(n)
+                Q.append(n)
+    return len(bfs) == len(members)
+
+def isCutVertex(graph,members,removed):
+    """
+    распадается ли связная часть members (индексы вершин) без вершины removed
+    обходы в ширину идут по очереди от каждого соседа removed из части и
+    сливаются при встрече: если все слились - часть связна, если какой-то
+    обход закончился раньше - он обошел отделившийся кусок, поэтому проверка
+    обычно не выходит за окрестность removed или за меньший из кусков
+    """
+    indptr = graph.indptr
+    indices = graph.indices
+    rest = [ n for n in indices[indptr[removed]:indptr[removed+1]] if n in members ]
+    if ( len(rest) < 2 ):
+        return False
+    mark = { removed: -1 }    # вершина -> номер обхода, который ее нашел
+    Q = []
+    for i in range(len(rest)):
+        mark[rest[i]] = i
+        Q.append(deque([ rest[i] ]))
+    root = list(range(len(rest)))    # слившиеся обходы
+    active = list(range(len(rest)))
+    while True:
+        for i in list(active):
+            if ( root[i] != i ):
+                continue
+            if ( len(Q[i]) == 0 ):
+                return True
+            p = Q[i].popleft()
+            for n in indices[indptr[p]:indptr[p+1]]:
+                if ( n not in members ):
+                    continue
+                j = mark.get(n)
+                if ( j == None ):
+                    mark[n] = i
+                    Q[i].append(n)
+                    continue
+                if ( j < 0 ):
+                    continue
+                while ( root[j] != j ):
+                    j = root[j]
+                if ( j != i ):
+                    root[j] = i
+                    Q[i].extend(Q[j])
+                    active.remove(j)
+                    if ( len(active) == 1 ):
+                        return False
+
+def refineParts(graph,parts,dirty=None):
+    """
+    балансировка разбиения: граничные области переносятся из большей части
+    в соседнюю меньшую, пока это уменьшает разницу площадей и части
+    остаются связными
+    все области частей должны быть вершинами graph
+    dirty - номера частей, с которых начинается балансировка (None - все)
+    """
+    indptr = graph.indptr
+    indices = graph.indices
+    areas = graph.areas
+    partsidx = [ [ graph.index(s) for s in part ] for part in parts ]
+    owner = [-1]*len(graph)
+    for i in range(len(parts)):
+        for s in partsidx[i]:
+            owner[s] = i
+    members = [ set(part) for part in partsidx ]
+    area = [ sum(areas[s] for s in part) for part in partsidx ]
+    Q = deque(sorted(range(len(parts)) if dirty == None else dirty))
+    queued = set(Q)
+    connected = dict()    # часть -> связна ли
+    cuts = defaultdict(dict)    # часть -> { вершина: точка сочленения ли }
+    moves = 0
+    while ( len(Q) > 0 ):
+        a = Q.popleft()
+        queued.discard(a)
+        candidates = []
+        for s in sorted(members[a]):
+            for n in indices[indptr[s]:indptr[s+1]]:
+                b = owner[n]
+                if ( b < 0 or b == a ):
+                    continue
+                # переносим из большей части в меньшую
+                src, dst, m = ( a, b, s ) if area[a] > area[b] else ( b, a, n )
+                gain = area[src] - area[dst] - areas[m]
+                if ( gain <= 0 or len(members[src]) < 2 ):
+                    continue
+                candidates.append(( -gain, len(candidates), src, dst, m ))
+        # лучший перенос - с наибольшим выигрышем (при равенстве - первый
+        # найденный), после которого часть остается связной: часть связна
+        # и переносимая область не точка сочленения
+        best = None
+        for c in sorted(candidates):
+            src, m = c[2], c[4]
+            if ( src not in connected ):
+                connected[src] = isConnected(graph,members[src])
+            if ( not connected[src] ):
+                continue
+            if ( m not in cuts[src] ):
+                cuts[src][m] = isCutVertex(graph,members[src],m)
+            if ( not cuts[src][m] ):
+                best = c
+                break
+        if ( best == None ):
+            continue
+        _, _, src, dst, m = best
+        logger.debug("move {} from part {} to part {}".format(graph.ids[m],src,dst))
+        members[src].remove(m)
+        members[dst].add(m)
+        # src остается связной, а несвязная dst может стать связной
+        if ( connected.get(dst) == False ):
+            del connected[dst]
+        cuts.pop(src,None)
+        cuts.pop(dst,None)
+        owner[m] = dst
+        area[src] -= areas[m]
+        area[dst] += areas[m]
+        moves += 1
+        for p in ( a, src, dst ):
+            if ( p not in queued ):
+                Q.append(p)
+                queued.add(p)
+    logger.info("moved {} shapes between parts".format(moves))
+    for i in range(len(parts)):
+        parts[i] = [ graph.ids[s] for s in sorted(members[i]) ]
+
+def updateParts(graph,parts,affected):
+    """
+    обновление разбиения после изменений: удаленные области и области
+    без соседей убираются (в том числе не измененные, соседи которых
+    удалены - как при полном запуске, они попадают в islands), новые
+    присоединяются к соседней части с меньшей площадью, затем
+    затронутые части балансируются
+    graph - граф всех областей
+    """
+    indptr = graph.indptr
+    indices = graph.indices
+    partof = dict()
+    dirty = set()
+    for i in range(len(parts)):
+        part = []
+        for s in parts[i]:
+            k = graph.index(s)
+            if ( k < 0 or indptr[k] == indptr[k+1] ):
+                dirty.add(i)
+                continue
+            part.append(s)
+            partof[s] = i
+        parts[i][:] = part
+    for s in affected:
+        if ( s in partof ):
+            dirty.add(partof[s])
+    owner = [ partof.get(s,-1) for s in graph.ids ]
+    area = [ sum(shapes_areas[s] for s in part) for part in parts ]
+    added = True
+    while added:
+        added = False
+        for s in range(len(graph)):
+            if ( owner[s] >= 0 ):
+                continue
+            near = [ owner[n] for n in indices[indptr[s]:indptr[s+1]] if owner[n] >= 0 ]
+            if ( len(near) == 0 ):
+                continue
+            i = min(near, key=lambda p: ( area[p], p ))
+            parts[i].append(graph.ids[s])
+            owner[s] = i
+            area[i] += graph.areas[s]
+            dirty.add(i)
+            added = True
+    refineParts(graph,parts,dirty)
+
 #======================================================================================
 
 logging.basicConfig(level=logging.INFO,format="%(asctime)s %(levelname)s %(message)s")
@@ -324,65 +1755,132 @@ logger = logging.getLogger(__name__)
 logger.info("start")
 logger.info("parse arguments")
 parser = argparse.ArgumentParser(description="Divide group of OSM multipolygons into two complete parts")
-parser.add_argument("--file","-f",required=True,
-        help="input OSM file (required)")
-parser.add_argument("--num","-n",type=int, default=1,
+parser.add_argument("--file","-f",
+        help="input OSM file (required unless --osc is given)")
+parser.add_argument("--format", choices=["xml","pbf"], default=None,
+        help="input file format (default: pbf for *.pbf files, xml otherwise)")
+parser.add_argument("--jobs","-j",type=int, default=1,
+        help="number of worker processes (default: 1)")
+division = parser.add_mutually_exclusive_group()
+division.add_argument("--num","-n",type=int, default=1,
         help="repeat n times (you will get 2^n parts, default: 1)")
+division.add_argument("--parts","-k",type=int, default=None,
+        help="grow K parts at once and balance them instead of repeated "
+             "division into halves, any K >= 1 (default: off)")
+parser.add_argument("--two-pass","-2", dest="twopass", action="store_true", default=False,
+        help="read relations first, then only ways and nodes they use (default: off)")
+parser.add_argument("--area-method", dest="area_method", choices=["geodesic","authalic","lambert"], default="geodesic",
+        help="area calculation: exact geodesic, spherical excess on the authalic sphere or "
+             "Lambert equal-area projection, the last two need numpy (default: geodesic, "
+             "with --osc the method saved in --state is used)")
+parser.add_argument("--cache","-c",
+        help="directory for cache of parsed OSM data, rings and areas (default: no cache)")
+parser.add_argument("--state",
+        help="file to save the run state to, used by --osc (default: not saved)")
+parser.add_argument("--osc",
+        help="osmChange file to apply to the saved --state instead of a full run; "
+             "relations using ways or nodes that are not in the state (not read with "
+             "--two-pass, or broken when the state was saved) are dropped with a "
+             "warning and need a full run")
 parser.add_argument("--debug","-d", action="store_true", default=False, 
         help="show debug messages (default: off)")
 args = parser.parse_args();
 if (args.debug):
     logger.setLevel(logging.DEBUG)
+if (args.osc == None and args.file == None):
+    parser.error("--file is required")
+if (args.osc and args.state == None):
+    parser.error("--osc requires --state")
+if (args.parts != None and args.parts < 1):
+    parser.error("--parts must be at least 1")
+if (args.area_method != "geodesic" and numpy == None):
+    parser.error("--area-method {} requires numpy".format(args.area_method))
+area_method = args.area_method
 
-logger.info("read OSM file")
-osm = readOsmFile(args.file)
-logger.info("merge ways into rings and calc area")
-for k in osm["rels"]["outer"]:
-    logger.debug(k)
-    ( shapes[k], shapes_areas[k] )  = mergeWays(osm["rels"]["outer"][k])
-    logger.debug("area {:10} {:10.2f} km2".format(k,shapes_areas[k]/1000000))
-
-parts = [ list(shapes.keys()) ]
-for loopnum in range(0,args.num):
-    logger.debug("partition {}".format(loopnum))
-    newparts = []
-    for part in parts:
-        if ( len(part) < 2 ):
-            newparts.append(part)
-            continue
-        logger.info("create graph")
-        logger.debug("number of shapes: {}".format(len(part)))
-        G = createGraph(part)
-        logger.debug("graph size: {}".format(len(G)))
-        s1 = getFarthestPoint(G,list(G.keys())[0])
-        s2 = getFarthestPoint(G,s1)
-        logger.info("divide graph")
-        newparts += divideGraph(G,s1,s2)
-    parts = newparts
+if (args.osc):
+    logger.info("read state")
+    ( G, parts ) = loadState(args.state)
+    logger.info("read osmChange file")
+    changes = readOscFile(args.osc)
+    affected = applyChanges(changes)
+    logger.info("merge ways into rings and calc area")
+    updateShapes(affected)
+    logger.info("update graph")
+    updateGraph(G,affected)
+    logger.info("update partition")
+    updateParts(Graph(G,shapes.keys()),parts,affected)
+else:
+    logger.info("read OSM file")
+    if (args.format == None):
+        args.format = "pbf" if re.search(r"\.pbf(\.(gz|bz2|xz))?$",args.file) else "xml"
+    if (args.cache):
+        os.makedirs(args.cache,exist_ok=True)
+        cachefile = osmCacheFile(args.cache,args.file)
+        if (os.path.exists(cachefile)):
+            logger.info("read OSM cache {}".format(cachefile))
+            osm = readOsmCache(cachefile)
+    if (osm == None):
+        osm = readOsmFile(args.file,args.twopass,args.format,args.jobs)
+        if (args.cache):
+            logger.info("write OSM cache {}".format(cachefile))
+            writeOsmCache(cachefile,osm)
+    logger.info("merge ways into rings and calc area")
+    mergeShapes(os.path.join(args.cache,"rings.cache") if args.cache else None,args.jobs)
+
+    logger.info("create graph")
+    G = createGraph(list(shapes.keys()))
+    graph = Graph(G)
+    logger.debug("graph size: {}".format(len(graph)))
+    if (args.parts):
+        logger.info("grow {} parts".format(args.parts))
+        parts = growParts(graph,args.parts) if len(graph) > 0 else []
+        logger.info("balance parts")
+        refineParts(graph,parts)
+    else:
+        parts = [ list(shapes.keys()) ]
+        # части одного уровня делятся независимо, результаты собираются
+        # в исходном порядке, поэтому разбиение то же, что и без пула
+        pool = None
+        if ( args.jobs > 1 and args.num > 1 ):
+            pool = multiprocessing.get_context("fork").Pool(args.jobs)
+        for loopnum in range(0,args.num):
+            logger.debug("partition {}".format(loopnum))
+            if ( pool != None and len(parts) > 1 ):
+                parts = list(chain.from_iterable(pool.imap(dividePart, parts)))
+            else:
+                parts = list(chain.from_iterable(map(dividePart, parts)))
+        if ( pool != None ):
+            pool.close()
+            pool.join()
+state_parts = [ list(part) for part in parts ]
 
 logger.info("get nested shapes")
 nested_shapes = getNestedShapes()
 islands = set(shapes.keys())
 for part in parts:
     islands -= set(part)
-for si in ( islands & set(nested_shapes.keys()) ):
+# id выводятся в порядке строк, как в версии с текстовыми id
+for si in sorted(islands & set(nested_shapes.keys()), key=str):
     so = nested_shapes[si][0]
     for part in parts:
         if so in part:
             part.append(si)
     islands.remove(si)
-parts.append([])
-for s in islands:
-    parts[-1].append(s)
+islands = sorted(islands, key=str)
+parts.append(list(islands))
 
 logger.info("print result")
 for p in range(0,len(parts)):
     if ( len(parts[p]) > 0 ):
         logger.debug("part {}: {}".format(p,len(parts[p])))
-        print("{}: {}".format(p,", ".join(parts[p])))
+        print("{}: {}".format(p,", ".join(map(str,parts[p]))))
 if ( len(islands) > 0 ):
     logger.debug("islands: {}".format(p,len(islands)))
-    print("islands: {}".format(", ".join(islands)))
+    print("islands: {}".format(", ".join(map(str,islands))))
+
+if (args.state):
+    logger.info("save state")
+    saveState(args.state,G,state_parts)
 
 logger.info("finish")
 
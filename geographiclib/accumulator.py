@@ -12,11 +12,14 @@
 # http://geographiclib.sourceforge.net/
 ######################################################################
 
-from geographiclib.geomath import Math
+import math
 
 class Accumulator(object):
   """Like math.fsum, but allows a running sum"""
 
+  # PolygonArea creates and copies these for every polygon
+  __slots__ = ('_s', '_t')
+
   def Set(self, y):
     """Set value from argument"""
     if type(self) == type(y):
@@ -31,8 +34,19 @@ class Accumulator(object):
     """Add a value"""
     # Here's Shewchuk's solution...
     # hold exact sum as [s, t, u]
-    y, u = Math.sum(y, self._t)             # Accumulate starting at
-    self._s, self._t = Math.sum(y, self._s) # least significant end
+    # Math.sum(y, self._t) and Math.sum(y, self._s) are written out to save
+    # the function calls and tuple packing.
+    v = self._t                 # Accumulate starting at
+    s = y + v                   # least significant end
+    up = s - v
+    vpp = s - up
+    u = -((up - y) + (vpp - v))
+    y = s
+    v = self._s
+    s = y + v
+    up = s - v
+    vpp = s - up
+    t = -((up - y) + (vpp - v))
     # Start is _s, _t decreasing and non-adjacent.  Sum is now (s + t + u)
     # exactly with s, t, u non-adjacent and in decreasing order (except
     # for possible zeros).  The following code tries to normalize the
@@ -61,10 +75,22 @@ class Accumulator(object):
     # [128, 16] + 1 -> [160, -16] -- 160 = round(145).
     # But [160, 0] - 16 -> [128, 16] -- 128 = round(144).
     #
-    if self._s == 0:            # This implies t == 0,
-      self._s = u               # so result is u
+    if s == 0:                  # This implies t == 0,
+      s = u                     # so result is u
     else:
-      self._t += u              # otherwise just accumulate u to t.
+      t += u                    # otherwise just accumulate u to t.
+    self._s = s; self._t = t
+
+  def AddMany(self, ys):
+    """Add a sequence of values"""
+    # math.fsum gives the correctly rounded sum of ys and a second fsum with
+    # the sum subtracted gives its rounding error, so the whole sequence is
+    # added as [s, e] with two calls of Add.
+    ys = list(ys)
+    s = math.fsum(ys)
+    ys.append(-s)
+    self.Add(s)
+    self.Add(math.fsum(ys))
 
   def Sum(self, y = 0.0):
     """Return sum + y"""
@@ -0,0 +1,114 @@
+"""benchmark.py: micro benchmarks for geographiclib."""
+# benchmark.py
+#
+# Times the building blocks which the polygon area calculation calls once
+# per vertex, the construction of Geodesic and GeodesicLine objects, the
+# throughput of Inverse and InverseMany and the import of
+# geographiclib.geodesic.  Run with
+#
+#    python3 -m geographiclib.benchmark
+#
+######################################################################
+
+import random
+import subprocess
+import sys
+import timeit
+from geographiclib.accumulator import Accumulator
+from geographiclib.geodesic import Geodesic
+
+def accumulator(n = 100000, repeat = 5):
+  """Return ns per value for Accumulator.Add, AddMany and Sum(y)"""
+  rand = random.Random(1)
+  ys = [rand.uniform(-1e13, 1e13) for _ in range(n)]
+  def add():
+    a = Accumulator()
+    for y in ys:
+      a.Add(y)
+  def addmany():
+    a = Accumulator()
+    a.AddMany(ys)
+  a = Accumulator(1e13)
+  def sumy():
+    for y in ys:
+      a.Sum(y)
+  return dict((name, min(timeit.repeat(f, number = 1, repeat = repeat))
+               / n * 1e9)
+              for name, f in (('Add', add), ('AddMany', addmany),
+                              ('Sum(y)', sumy)))
+
+def construction(n = 20000, repeat = 5):
+  """Return us per Geodesic and GeodesicLine construction"""
+  geod = Geodesic.WGS84
+  rand = random.Random(1)
+  azis = [rand.uniform(-180, 180) for _ in range(n)]
+  def ellipsoid():
+    for _ in azis:
+      Geodesic(6378137, 1/298.257223563)
+  def line_same():
+    for _ in azis:
+      geod.Line(40.6, -73.8, 45)
+  def line_random():
+    for azi in azis:
+      geod.Line(40.6, -73.8, azi)
+  return dict((name, min(timeit.repeat(f, number = 1, repeat = repeat))
+               / n * 1e6)
+              for name, f in (('Geodesic', ellipsoid),
+                              ('Line (same azi)', line_same),
+                              ('Line (random azi)', line_random)))
+
+def pairs(mix, n, rand):
+  """Return n pairs of points (lat1, lon1, lat2, lon2) of the given mix"""
+  lat1 = [rand.uniform(-90, 90) for _ in range(n)]
+  lon1 = [rand.uniform(-180, 180) for _ in range(n)]
+  if mix == 'short':
+    lat2 = [max(-90, min(90, lat + rand.uniform(-0.1, 0.1))) for lat in lat1]
+    lon2 = [lon + rand.uniform(-0.1, 0.1) for lon in lon1]
+  elif mix == 'antipodal':
+    lat2 = [-lat + rand.uniform(-0.5, 0.5) for lat in lat1]
+    lat2 = [max(-90, min(90, lat)) for lat in lat2]
+    lon2 = [lon + 180 + rand.uniform(-0.5, 0.5) for lon in lon1]
+  else:
+    lat2 = [rand.uniform(-90, 90) for _ in range(n)]
+    lon2 = [rand.uniform(-180, 180) for _ in range(n)]
+  return lat1, lon1, lat2, lon2
+
+def inverse(sizes = (10, 1000, 100000), ninverse = 2000, repeat = 3):
+  """Return pairs/s for Inverse and InverseMany with several mixes"""
+  geod = Geodesic.WGS84
+  result = {}
+  for mix in ('short', 'random', 'antipodal'):
+    rand = random.Random(1)
+    lat1, lon1, lat2, lon2 = pairs(mix, ninverse, rand)
+    def one():
+      for i in range(ninverse):
+        geod.Inverse(lat1[i], lon1[i], lat2[i], lon2[i])
+    result[(mix, 'Inverse', ninverse)] = ninverse / min(
+      timeit.repeat(one, number = 1, repeat = repeat))
+    for n in sizes:
+      lat1, lon1, lat2, lon2 = pairs(mix, n, rand)
+      many = lambda: geod.InverseMany(lat1, lon1, lat2, lon2)
+      result[(mix, 'InverseMany', n)] = n / min(
+        timeit.repeat(many, number = 1, repeat = repeat))
+  return result
+
+def importtime(module = 'geographiclib.geodesic', repeat = 5):
+  """Return ms to import module in a fresh interpreter"""
+  code = ('import time; t = time.perf_counter(); import {}; '
+          'print(time.perf_counter() - t)').format(module)
+  return min(float(subprocess.check_output([sys.executable, '-c', code]))
+             for _ in range(repeat)) * 1e3
+
+if __name__ == '__main__':
+  for name, ns in sorted(accumulator().items()):
+    print("Accumulator.{:8} {:8.1f} ns/value".format(name, ns))
+  for name, us in sorted(construction().items()):
+    print("{:22} {:8.2f} us".format(name, us))
+  try:
+    import numpy
+  except ImportError:
+    print("InverseMany needs numpy, skipped")
+  else:
+    for (mix, name, n), rate in inverse().items():
+      print("{:9} {:11} n={:<6} {:10.0f} pairs/s".format(mix, name, n, rate))
+  print("{:22} {:8.2f} ms".format("import geodesic", importtime()))
@@ -46,15 +46,20 @@ class Geodesic(object):
     def p(lat,lon): return {'lat': lat, 'lon': lon}
 
     Geodesic.WGS84.Area([p(0, 0), p(0, 90), p(90, 0)])
+    Geodesic.WGS84.AreaPoints([(0, 0), (0, 90), (90, 0)])
 
   Documentation on these routines is available via
 
     help(Geodesic.__init__)
     help(Geodesic.Inverse)
+    help(Geodesic.InverseMany)
     help(Geodesic.Direct)
     help(Geodesic.Line)
     help(line.Position)
+    help(line.Positions)
     help(Geodesic.Area)
+    help(Geodesic.AreaPoints)
+    help(Geodesic.AreaArray)
 
   All angles (latitudes, longitudes, azimuths, spherical arc lengths) are
   measured in degrees.  All lengths (distance, reduced length) are measured in
@@ -102,6 +107,10 @@ class Geodesic(object):
   AREA          = 1 << 14 | CAP_C4
   ALL           = OUT_ALL | CAP_ALL
 
+  # Series coefficients for each (a, f) seen so far, shared by all the
+  # Geodesic objects for the same ellipsoid
+  _coeffcache = {}
+
   def SinCosSeries(sinp, sinx, cosx, c, n):
     """Private: Evaluate a trig series using Clenshaw summation."""
     # Evaluate
@@ -206,15 +215,15 @@ class Geodesic(object):
     eps2 = Math.sq(eps)
     d = eps
     c[1] = d*((6-eps2)*eps2-16)/32
-    d *= eps
+    d = d * eps
     c[2] = d*((64-9*eps2)*eps2-128)/2048
-    d *= eps
+    d = d * eps
     c[3] = d*(9*eps2-16)/768
-    d *= eps
+    d = d * eps
     c[4] = d*(3*eps2-5)/512
-    d *= eps
+    d = d * eps
     c[5] = -7*d/1280
-    d *= eps
+    d = d * eps
     c[6] = -7*d/2048
   C1f = staticmethod(C1f)
 
@@ -223,15 +232,15 @@ class Geodesic(object):
     eps2 = Math.sq(eps)
     d = eps
     c[1] = d*(eps2*(205*eps2-432)+768)/1536
-    d *= eps
+    d = d * eps
     c[2] = d*(eps2*(4005*eps2-4736)+3840)/12288
-    d *= eps
+    d = d * eps
     c[3] = d*(116-225*eps2)/384
-    d *= eps
+    d = d * eps
     c[4] = d*(2695-7173*eps2)/7680
-    d *= eps
+    d = d * eps
     c[5] = 3467*d/7680
-    d *= eps
+    d = d * eps
     c[6] = 38081*d/61440
   C1pf = staticmethod(C1pf)
 
@@ -247,15 +256,15 @@ class Geodesic(object):
     eps2 = Math.sq(eps)
     d = eps
     c[1] = d*(eps2*(eps2+2)+16)/32
-    d *= eps
+    d = d * eps
     c[2] = d*(eps2*(35*eps2+64)+384)/2048
-    d *= eps
+    d = d * eps
     c[3] = d*(15*eps2+80)/768
-    d *= eps
+    d = d * eps
     c[4] = d*(7*eps2+35)/512
-    d *= eps
+    d = d * eps
     c[5] = 63*d/1280
-    d *= eps
+    d = d * eps
     c[6] = 77*d/2048
   C2f = staticmethod(C2f)
 
@@ -293,12 +302,17 @@ class Geodesic(object):
       raise ValueError("Major radius is not positive")
     if not(Math.isfinite(self._b) and self._b > 0):
       raise ValueError("Minor radius is not positive")
-    self._A3x = list(range(Geodesic.nA3x_))
-    self._C3x = list(range(Geodesic.nC3x_))
-    self._C4x = list(range(Geodesic.nC4x_))
-    self.A3coeff()
-    self.C3coeff()
-    self.C4coeff()
+    coeff = Geodesic._coeffcache.get((self._a, self._f))
+    if coeff is None:
+      self._A3x = list(range(Geodesic.nA3x_))
+      self._C3x = list(range(Geodesic.nC3x_))
+      self._C4x = list(range(Geodesic.nC4x_))
+      self.A3coeff()
+      self.C3coeff()
+      self.C4coeff()
+      coeff = (self._A3x, self._C3x, self._C4x)
+      Geodesic._coeffcache[self._a, self._f] = coeff
+    self._A3x, self._C3x, self._C4x = coeff
 
   def A3coeff(self):
     """Private: return coefficients for A3"""
@@ -436,7 +450,7 @@ class Geodesic(object):
   # return sig12, salp1, calp1, salp2, calp2, dnm
   def InverseStart(self, sbet1, cbet1, dn1, sbet2, cbet2, dn2, lam12,
                    # Scratch areas of the right size
-                   C1a, C2a):
+                   C1a, C2a, shortlen = 0):
     """Private: Find a starting value for Newton's method."""
     # Return a starting point for Newton's method in salp1 and calp1 (function
     # value is -1).  If Newton's method doesn't need to be used, return also
@@ -472,8 +486,12 @@ class Geodesic(object):
     ssig12 = math.hypot(salp1, calp1)
     csig12 = sbet1 * sbet2 + cbet1 * cbet2 * comg12
 
-    if shortline and ssig12 < self._etol2:
-      # really short lines
+    if shortline and (ssig12 < self._etol2 or
+                      # The error in the area grows with omg12, which is
+                      # much larger than sig12 near the poles
+                      (ssig12 * self._b * dnm < shortlen and
+                       omg12 < 10 * ssig12)):
+      # really short lines (or short enough for the caller)
       salp2 = cbet1 * somg12
       calp2 = sbet12 - cbet1 * sbet2 * (Math.sq(somg12) / (1 + comg12)
                                         if comg12 >= 0 else 1 - comg12)
@@ -647,7 +665,7 @@ class Geodesic(object):
             domg12, dlam12)
 
   # return a12, s12, azi1, azi2, m12, M12, M21, S12
-  def GenInverse(self, lat1, lon1, lat2, lon2, outmask):
+  def GenInverse(self, lat1, lon1, lat2, lon2, outmask, shortlen = 0):
     """Private: General version of the inverse problem"""
     a12 = s12 = azi1 = azi2 = m12 = M12 = M21 = S12 = Math.nan # return vals
 
@@ -787,7 +805,7 @@ class Geodesic(object):
 
       # Figure a starting point for Newton's method
       sig12, salp1, calp1, salp2, calp2, dnm = self.InverseStart(
-        sbet1, cbet1, dn1, sbet2, cbet2, dn2, lam12, C1a, C2a)
+        sbet1, cbet1, dn1, sbet2, cbet2, dn2, lam12, C1a, C2a, shortlen)
 
       if sig12 >= 0:
         # Short lines (InverseStart sets salp2, calp2, dnm)
@@ -1021,6 +1039,51 @@ class Geodesic(object):
     if outmask & Geodesic.AREA: result['S12'] = S12
     return result
 
+  def InverseMany(self, lat1, lon1, lat2, lon2,
+                  outmask = DISTANCE | AZIMUTH):
+    """
+    Solve the inverse geodesic problem for many pairs of points at once.
+    lat1, lon1, lat2, lon2 are sequences of the same length (or numpy
+    arrays).  Return a dictionary with the same entries as Inverse, each
+    entry a numpy array with one element per pair of points.
+
+    The common case is solved with numpy for all pairs together (numpy
+    must be installed); meridional, equatorial and nearly antipodal
+    pairs and those where Newton's method does not converge quickly are
+    solved one by one with GenInverse.  The results agree with Inverse
+    to within 1e-11 (relative) in distance and 1e-9 degrees in azimuth.
+    The area S12 agrees to within 4e-15 c2 (0.16 m^2 for WGS84), except
+    for nearly antipodal points (a12 > 170 degrees) where it is very
+    sensitive to the azimuth and the difference may reach 2e-13 c2.
+    """
+
+    import numpy as np
+    from geographiclib.geodesicarray import GeodesicArray
+    lat1 = np.asarray(lat1, dtype = float)
+    lon1 = np.asarray(lon1, dtype = float)
+    lat2 = np.asarray(lat2, dtype = float)
+    lon2 = np.asarray(lon2, dtype = float)
+    if not (lat1.ndim == 1 and
+            lat1.shape == lon1.shape == lat2.shape == lon2.shape):
+      raise ValueError("lat1, lon1, lat2, lon2 must be 1-d arrays of the"
+                       " same length")
+    lon1 = GeodesicArray.CheckPosition(lat1, lon1)
+    lon2 = GeodesicArray.CheckPosition(lat2, lon2)
+
+    result = {'lat1': lat1, 'lon1': lon1, 'lat2': lat2, 'lon2': lon2}
+    a12, s12, azi1, azi2, m12, M12, M21, S12 = GeodesicArray.GenInverse(
+      self, lat1, lon1, lat2, lon2, outmask)
+    outmask &= Geodesic.OUT_ALL
+    result['a12'] = a12
+    if outmask & Geodesic.DISTANCE: result['s12'] = s12
+    if outmask & Geodesic.AZIMUTH:
+      result['azi1'] = azi1; result['azi2'] = azi2
+    if outmask & Geodesic.REDUCEDLENGTH: result['m12'] = m12
+    if outmask & Geodesic.GEODESICSCALE:
+      result['M12'] = M12; result['M21'] = M21
+    if outmask & Geodesic.AREA: result['S12'] = S12
+    return result
+
   # return a12, lat2, lon2, azi2, s12, m12, M12, M21, S12
   def GenDirect(self, lat1, lon1, azi1, arcmode, s12_a12, outmask):
     """Private: General version of direct problem"""
@@ -1160,7 +1223,7 @@ class Geodesic(object):
       # Automatically supply DISTANCE_IN
       caps | Geodesic.DISTANCE_IN)
 
-  def Area(self, points, polyline = False):
+  def Area(self, points, polyline = False, shortlen = 0):
     """
     Compute the area of a geodesic polygon given by points, an array of
     dictionaries with entries lat and lon.  Return a dictionary with
@@ -1173,12 +1236,72 @@ class Geodesic(object):
     There is no need to "close" the polygon.  If polyline is set to
     True, then the points define a polyline instead of a polygon, the
     length is returned as the perimeter, and the area is not returned.
+
+    Edges shorter than shortlen meters (estimated on the auxiliary
+    sphere) skip Newton's method and are solved with the short line
+    formulas, unless they are near a pole and span more than 10 times
+    their length in longitude.  This is off by default.  For WGS84 edges
+    up to 1 km the distance agrees with the full solution to within 1e-8
+    m; S12 of an edge agrees to within 0.005 m^2 at 100 m, 0.1 m^2 at 300
+    m and 5 m^2 at 1 km (the error grows as the cube of the length) and
+    these errors mostly cancel around a closed polygon, e.g., to within
+    2e-11 of the area for a polygon with 150 m edges.
     """
 
     from geographiclib.polygonarea import PolygonArea
     for p in points:
       Geodesic.CheckPosition(p['lat'], p['lon'])
-    num, perimeter, area = PolygonArea.Area(self, points, polyline)
+    num, perimeter, area = PolygonArea.Area(self, points, polyline, shortlen)
+    result = {'number': num, 'perimeter': perimeter}
+    if not polyline: result['area'] = area
+    return result
+
+  def AreaPoints(self, lats, lons = None, polyline = False, shortlen = 0):
+    """
+    Compute the area of a geodesic polygon given by lats, an iterable of
+    (lat, lon) pairs, or, if lons is given, by the parallel sequences of
+    vertex latitudes lats and longitudes lons.  The result is the same
+    dictionary as returned by Area.
+
+    Each vertex is checked and added to the polygon in a single pass, so
+    the vertices can come from a generator and need not be wrapped in
+    dictionaries.
+    """
+
+    from geographiclib.polygonarea import PolygonArea
+    points = lats if lons is None else zip(lats, lons)
+    num, perimeter, area = PolygonArea.AreaPoints(self, points, polyline,
+                                                  shortlen)
+    result = {'number': num, 'perimeter': perimeter}
+    if not polyline: result['area'] = area
+    return result
+
+  def AreaArray(self, lats, lons, polyline = False, shortlen = 0):
+    """
+    Compute the area of a geodesic polygon given by the sequences of
+    vertex latitudes lats and longitudes lons.  The result is the same
+    dictionary as returned by Area.
+
+    The edges are solved together with numpy (which must be installed);
+    only meridional, equatorial and nearly antipodal edges go through
+    the scalar code.  Each edge agrees with GenInverse to within 1e-11 of
+    the distance (relative) and 4e-15 c2 of the area (0.16 m^2 for
+    WGS84), so for n vertices the perimeter agrees with Area to within
+    1e-11 (relative) and the area to within n * 4e-15 c2.  Edges longer
+    than 170 degrees of arc are the exception: their area is very
+    sensitive to the azimuth and may differ by up to 2e-13 c2.  shortlen
+    is the same as for Area.
+    """
+
+    import numpy as np
+    from geographiclib.geodesicarray import GeodesicArray
+    lats = np.asarray(lats, dtype = float)
+    lons = np.asarray(lons, dtype = float)
+    if lats.shape != lons.shape or lats.ndim != 1:
+      raise ValueError("lats and lons must be 1-d arrays of the same length")
+    GeodesicArray.CheckPosition(lats, lons)
+    num, perimeter, area = GeodesicArray.Area(self, lats, lons, polyline,
+                                              shortlen)
     result = {'number': num, 'perimeter': perimeter}
     if not polyline: result['area'] = area
     return result
@@ -0,0 +1,552 @@
+"""geodesicarray.py: vectorized geodesic calculations with numpy."""
+# geodesicarray.py
+#
+# This evaluates the geodesic inverse problem, points along a geodesic line
+# and the area of geodesic polygons for whole arrays of points at once.  The
+# algorithms are the ones in geodesic.py, geodesicline.py and polygonarea.py
+# with the scalar branches replaced by numpy masks.  Points which need the
+# rarely used branches of the inverse problem (meridional and equatorial
+# geodesics, nearly antipodal points which need the astroid starting guess and
+# geodesics where Newton's method does not converge within maxit1_
+# iterations) are handed over to Geodesic.GenInverse one by one.
+#
+# The algorithms are derived in
+#
+#    Charles F. F. Karney,
+#    Algorithms for geodesics, J. Geodesy 87, 43-55 (2013),
+#    http://dx.doi.org/10.1007/s00190-012-0578-z
+#    Addenda: http://geographiclib.sf.net/geod-addenda.html
+#
+# numpy is only needed when these routines are called.
+######################################################################
+
+import math
+from geographiclib.geomath import Math
+from geographiclib.accumulator import Accumulator
+
+class GeodesicArray(object):
+  """Vectorized versions of the Geodesic routines"""
+
+  def AngNormalize(x):
+    """reduce angles in [-540,540) to [-180,180)"""
+    import numpy as np
+    return np.where(x >= 180, x - 360, np.where(x < -180, x + 360, x))
+  AngNormalize = staticmethod(AngNormalize)
+
+  def AngDiff(x, y):
+    """compute y - x and reduce to [-180,180] accurately"""
+    import numpy as np
+    d = y - x
+    up = d - y
+    vpp = d - up
+    t = -((up + x) + (vpp - y))
+    d = np.where((d - 180) + t > 0, d - 360,
+                 np.where((d + 180) + t <= 0, d + 360, d))
+    return d + t
+  AngDiff = staticmethod(AngDiff)
+
+  def AngRound(x):
+    """Private: Round angles so that small values underflow to zero."""
+    import numpy as np
+    z = 1/16.0
+    y = np.abs(x)
+    y = np.where(y < z, z - (z - y), y)
+    return np.where(x < 0, -y, y)
+  AngRound = staticmethod(AngRound)
+
+  hypotmin_ = math.ldexp(1.0, -400)
+  hypotmax_ = math.ldexp(1.0, 400)
+
+  def square(x):
+    """Private: x*x and its rounding error (Dekker)."""
+    c = 134217729.0 * x                 # 2^27 + 1 splits x into two halves
+    hi = c - (c - x)
+    lo = x - hi
+    p = x * x
+    return p, ((hi * hi - p) + 2 * hi * lo) + lo * lo
+  square = staticmethod(square)
+
+  def hypot(x, y):
+    """Private: sqrt(x^2 + y^2) correctly rounded as math.hypot."""
+    # np.hypot is off by an ulp in about one case in 200 and this is enough
+    # for the results to differ from Geodesic, which uses math.hypot.
+    import numpy as np
+    x = np.abs(x)
+    y = np.abs(y)
+    m = np.maximum(x, y)
+    ok = (m >= GeodesicArray.hypotmin_) & (m <= GeodesicArray.hypotmax_)
+    if np.all(ok):
+      # The usual case: the error terms below neither overflow nor underflow
+      e = None
+      u = x
+      v = y
+    else:
+      ok = np.isfinite(m) & (m > 0)
+      # Scale by a power of 2 to bring the larger one into [1/2, 1)
+      e = np.frexp(np.where(ok, m, 1))[1]
+      u = np.ldexp(np.where(ok, x, 1), -e)
+      v = np.ldexp(np.where(ok, y, 0), -e)
+    uu, uue = GeodesicArray.square(u)
+    vv, vve = GeodesicArray.square(v)
+    s = uu + vv
+    t = s - uu
+    err = ((uu - (s - t)) + (vv - t)) + (uue + vve)
+    h = np.sqrt(s + err)
+    # One Newton step with the exact residual s + err - h^2
+    hh, hhe = GeodesicArray.square(h)
+    h = h + (((s - hh) - hhe) + err) / (2 * h)
+    if e is None:
+      return h
+    return np.where(ok, np.ldexp(h, e), np.hypot(x, y))
+  hypot = staticmethod(hypot)
+
+  def SinCosNorm(sinx, cosx):
+    """Private: Normalize sin and cos."""
+    r = GeodesicArray.hypot(sinx, cosx)
+    return sinx/r, cosx/r
+  SinCosNorm = staticmethod(SinCosNorm)
+
+  def CheckPosition(lat, lon):
+    """Check that lat and lon are legal and return normalized lon"""
+    import numpy as np
+    bad = np.nonzero(~(np.abs(lat) <= 90))[0]
+    if len(bad):
+      raise ValueError("latitude " + str(lat[bad[0]]) + " not in [-90, 90]")
+    bad = np.nonzero(~((lon >= -540) & (lon < 540)))[0]
+    if len(bad):
+      raise ValueError("longitude " + str(lon[bad[0]]) + " not in [-540, 540)")
+    return GeodesicArray.AngNormalize(lon)
+  CheckPosition = staticmethod(CheckPosition)
+
+  def transit(lon1, lon2):
+    """Count crossings of prime meridian."""
+    import numpy as np
+    lon1 = GeodesicArray.AngNormalize(lon1)
+    lon2 = GeodesicArray.AngNormalize(lon2)
+    lon12 = GeodesicArray.AngDiff(lon1, lon2)
+    return np.where((lon1 < 0) & (lon2 >= 0) & (lon12 > 0), 1,
+                    np.where((lon2 < 0) & (lon1 >= 0) & (lon12 < 0), -1, 0))
+  transit = staticmethod(transit)
+
+  def Lambda12(geod, sbet1, cbet1, dn1, sbet2, cbet2, dn2, salp1, calp1):
+    """Private: Solve hybrid problem"""
+    import numpy as np
+    from geographiclib.geodesic import Geodesic
+    calp1 = np.where((sbet1 == 0) & (calp1 == 0), -Geodesic.tiny_, calp1)
+    salp0 = salp1 * cbet1
+    calp0 = GeodesicArray.hypot(calp1, salp1 * sbet1)
+    ssig1 = sbet1; somg1 = salp0 * sbet1
+    csig1 = comg1 = calp1 * cbet1
+    ssig1, csig1 = GeodesicArray.SinCosNorm(ssig1, csig1)
+    salp2 = np.where(cbet2 != cbet1, salp0 / cbet2, salp1)
+    calp2 = np.where(
+      (cbet2 != cbet1) | (np.abs(sbet2) != -sbet1),
+      np.sqrt(np.square(calp1 * cbet1) +
+              np.where(cbet1 < -sbet1, (cbet2 - cbet1) * (cbet1 + cbet2),
+                       (sbet1 - sbet2) * (sbet1 + sbet2))) / cbet2,
+      np.abs(calp1))
+    ssig2 = sbet2; somg2 = salp0 * sbet2
+    csig2 = comg2 = calp2 * cbet2
+    ssig2, csig2 = GeodesicArray.SinCosNorm(ssig2, csig2)
+    sig12 = np.arctan2(np.maximum(csig1 * ssig2 - ssig1 * csig2, 0.0),
+                       csig1 * csig2 + ssig1 * ssig2)
+    omg12 = np.arctan2(np.maximum(comg1 * somg2 - somg1 * comg2, 0.0),
+                       comg1 * comg2 + somg1 * somg2)
+    k2 = np.square(calp0) * geod._ep2
+    eps = k2 / (2 * (1 + np.sqrt(1 + k2)) + k2)
+    C3a = list(range(Geodesic.nC3_))
+    geod.C3f(eps, C3a)
+    B312 = (Geodesic.SinCosSeries(True, ssig2, csig2, C3a, Geodesic.nC3_-1) -
+            Geodesic.SinCosSeries(True, ssig1, csig1, C3a, Geodesic.nC3_-1))
+    h0 = -geod._f * geod.A3f(eps)
+    domg12 = salp0 * h0 * (sig12 + B312)
+    lam12 = omg12 + domg12
+    C1a = list(range(Geodesic.nC1_ + 1))
+    C2a = list(range(Geodesic.nC2_ + 1))
+    dummy, dlam12, dummy, dummy, dummy = geod.Lengths(
+      eps, sig12, ssig1, csig1, dn1, ssig2, csig2, dn2, cbet1, cbet2,
+      False, C1a, C2a)
+    dlam12 = np.where(calp2 == 0, - 2 * geod._f1 * dn1 / sbet1,
+                      dlam12 * geod._f1 / (calp2 * cbet2))
+    return (lam12, salp2, calp2, sig12, ssig1, csig1, ssig2, csig2, eps,
+            domg12, dlam12)
+  Lambda12 = staticmethod(Lambda12)
+
+  # return a12, s12, azi1, azi2, m12, M12, M21, S12
+  def GenInverse(geod, lat1, lon1, lat2, lon2, outmask, shortlen = 0):
+    """Private: Vectorized version of Geodesic.GenInverse"""
+    import numpy as np
+    from geographiclib.geodesic import Geodesic
+    lat1 = np.asarray(lat1, dtype = float)
+    lon1 = np.asarray(lon1, dtype = float)
+    lat2 = np.asarray(lat2, dtype = float)
+    lon2 = np.asarray(lon2, dtype = float)
+    n = len(lat1)
+    a12 = np.full(n, Math.nan); s12 = np.full(n, Math.nan)
+    azi1 = np.full(n, Math.nan); azi2 = np.full(n, Math.nan)
+    m12 = np.full(n, Math.nan); M12 = np.full(n, Math.nan)
+    M21 = np.full(n, Math.nan); S12 = np.full(n, Math.nan)
+    outmask &= Geodesic.OUT_ALL
+    scalep = (outmask & Geodesic.GEODESICSCALE) != 0
+    olat1, olon1, olat2, olon2 = lat1, lon1, lat2, lon2
+    errstate = np.seterr(all = 'ignore')
+    try:
+      lon12 = GeodesicArray.AngDiff(GeodesicArray.AngNormalize(lon1),
+                                    GeodesicArray.AngNormalize(lon2))
+      lon12 = GeodesicArray.AngRound(lon12)
+      lonsign = np.where(lon12 >= 0, 1.0, -1.0)
+      lon12 = lon12 * lonsign
+      lat1 = GeodesicArray.AngRound(lat1)
+      lat2 = GeodesicArray.AngRound(lat2)
+      swapp = np.where(np.abs(lat1) >= np.abs(lat2), 1.0, -1.0)
+      lonsign = np.where(swapp < 0, -lonsign, lonsign)
+      lat1, lat2 = (np.where(swapp < 0, lat2, lat1),
+                    np.where(swapp < 0, lat1, lat2))
+      latsign = np.where(lat1 < 0, 1.0, -1.0)
+      lat1 = lat1 * latsign
+      lat2 = lat2 * latsign
+
+      phi = lat1 * Math.degree
+      sbet1 = geod._f1 * np.sin(phi)
+      cbet1 = np.where(lat1 == -90, Geodesic.tiny_, np.cos(phi))
+      sbet1, cbet1 = GeodesicArray.SinCosNorm(sbet1, cbet1)
+      phi = lat2 * Math.degree
+      sbet2 = geod._f1 * np.sin(phi)
+      cbet2 = np.where(np.abs(lat2) == 90, Geodesic.tiny_, np.cos(phi))
+      sbet2, cbet2 = GeodesicArray.SinCosNorm(sbet2, cbet2)
+      south = cbet1 < -sbet1
+      sbet2 = np.where(south & (cbet2 == cbet1),
+                       np.where(sbet2 < 0, sbet1, -sbet1), sbet2)
+      cbet2 = np.where(~south & (np.abs(sbet2) == -sbet1), cbet1, cbet2)
+      dn1 = np.sqrt(1 + geod._ep2 * np.square(sbet1))
+      dn2 = np.sqrt(1 + geod._ep2 * np.square(sbet2))
+
+      lam12 = lon12 * Math.degree
+      slam12 = np.where(lon12 == 180, 0.0, np.sin(lam12))
+
+      # Meridional and equatorial geodesics are left to the scalar code
+      hard = (lat1 == -90) | (slam12 == 0) | (sbet1 == 0)
+
+      # InverseStart
+      sbet12 = sbet2 * cbet1 - cbet2 * sbet1
+      cbet12 = cbet2 * cbet1 + sbet2 * sbet1
+      sbet12a = sbet2 * cbet1 + cbet2 * sbet1
+      shortline = (cbet12 >= 0) & (sbet12 < 0.5) & (cbet2 * lam12 < 0.5)
+      sbetm2 = np.square(sbet1 + sbet2)
+      sbetm2 = sbetm2 / (sbetm2 + np.square(cbet1 + cbet2))
+      dnm = np.sqrt(1 + geod._ep2 * sbetm2)
+      omg12 = np.where(shortline, lam12 / (geod._f1 * dnm), lam12)
+      somg12 = np.sin(omg12); comg12 = np.cos(omg12)
+      salp1 = cbet2 * somg12
+      calp1 = np.where(
+        comg12 >= 0,
+        sbet12 + cbet2 * sbet1 * np.square(somg12) / (1 + comg12),
+        sbet12a - cbet2 * sbet1 * np.square(somg12) / (1 - comg12))
+      ssig12 = GeodesicArray.hypot(salp1, calp1)
+      csig12 = sbet1 * sbet2 + cbet1 * cbet2 * comg12
+      short = shortline & ((ssig12 < geod._etol2) |
+                           ((ssig12 * geod._b * dnm < shortlen) &
+                            (omg12 < 10 * ssig12))) & ~hard
+      salp2 = cbet1 * somg12
+      calp2 = sbet12 - cbet1 * sbet2 * np.where(
+        comg12 >= 0, np.square(somg12) / (1 + comg12), 1 - comg12)
+      salp2, calp2 = GeodesicArray.SinCosNorm(salp2, calp2)
+      sig12 = np.arctan2(ssig12, csig12)
+      # Nearly antipodal points need the astroid starting guess
+      hard |= ~short & ~((abs(geod._n) >= 0.1) | (csig12 >= 0) |
+                         (ssig12 >= 6 * abs(geod._n) * math.pi *
+                          np.square(cbet1)))
+      good = salp1 > 0
+      nsalp1, ncalp1 = GeodesicArray.SinCosNorm(salp1, calp1)
+      salp1 = np.where(good, nsalp1, 1.0)
+      calp1 = np.where(good, ncalp1, 0.0)
+
+      # Short lines
+      s12x = sig12 * geod._b * dnm
+      m12x = np.square(dnm) * geod._b * np.sin(sig12 / dnm)
+      M12x = np.cos(sig12 / dnm); M21x = M12x.copy()
+      omg12 = lam12 / (geod._f1 * dnm)
+
+      # Newton's method for the rest
+      idx = np.nonzero(~hard & ~short)[0]
+      numit = 0
+      Salp1 = salp1[idx]; Calp1 = calp1[idx]
+      salp1a = np.full(len(idx), Geodesic.tiny_)
+      calp1a = np.full(len(idx), 1.0)
+      salp1b = np.full(len(idx), Geodesic.tiny_)
+      calp1b = np.full(len(idx), -1.0)
+      tripn = np.zeros(len(idx), dtype = bool)
+      tripb = np.zeros(len(idx), dtype = bool)
+      act = np.arange(len(idx))
+      while len(act) and numit < Geodesic.maxit1_:
+        j = idx[act]
+        (nlam12, nsalp2, ncalp2, nsig12, ssig1, csig1, ssig2, csig2, eps,
+         domg12, dv) = GeodesicArray.Lambda12(
+           geod, sbet1[j], cbet1[j], dn1[j], sbet2[j], cbet2[j], dn2[j],
+           Salp1[act], Calp1[act])
+        v = nlam12 - lam12[j]
+        done = tripb[act] | ~(np.abs(v) >= np.where(tripn[act], 8, 2) *
+                              Geodesic.tol0_)
+        if done.any():
+          k = j[done]
+          s12b, m12b, dummy, nM12, nM21 = geod.Lengths(
+            eps[done], nsig12[done], ssig1[done], csig1[done], dn1[k],
+            ssig2[done], csig2[done], dn2[k], cbet1[k], cbet2[k], scalep,
+            list(range(Geodesic.nC1_ + 1)), list(range(Geodesic.nC2_ + 1)))
+          s12x[k] = s12b * geod._b
+          m12x[k] = m12b * geod._b
+          if scalep:
+            M12x[k] = nM12; M21x[k] = nM21
+          sig12[k] = nsig12[done]
+          salp1[k] = Salp1[act[done]]; calp1[k] = Calp1[act[done]]
+          salp2[k] = nsalp2[done]; calp2[k] = ncalp2[done]
+          omg12[k] = lam12[k] - domg12[done]
+        keep = ~done
+        act = act[keep]; v = v[keep]; dv = dv[keep]
+        sa = Salp1[act]; ca = Calp1[act]
+        upb = (v > 0) & (ca/sa > calp1b[act]/salp1b[act])
+        upa = ~upb & (v < 0) & (ca/sa < calp1a[act]/salp1a[act])
+        salp1b[act] = np.where(upb, sa, salp1b[act])
+        calp1b[act] = np.where(upb, ca, calp1b[act])
+        salp1a[act] = np.where(upa, sa, salp1a[act])
+        calp1a[act] = np.where(upa, ca, calp1a[act])
+        numit += 1
+        dalp1 = -v/dv
+        sdalp1 = np.sin(dalp1); cdalp1 = np.cos(dalp1)
+        nsalp1 = sa * cdalp1 + ca * sdalp1
+        newton = ((numit < Geodesic.maxit1_) & (dv > 0) & (nsalp1 > 0) &
+                  (np.abs(dalp1) < math.pi))
+        nsalp1, ncalp1 = GeodesicArray.SinCosNorm(
+          nsalp1, ca * cdalp1 - sa * sdalp1)
+        bsalp1, bcalp1 = GeodesicArray.SinCosNorm(
+          (salp1a[act] + salp1b[act])/2, (calp1a[act] + calp1b[act])/2)
+        Salp1[act] = np.where(newton, nsalp1, bsalp1)
+        Calp1[act] = np.where(newton, ncalp1, bcalp1)
+        tripn[act] = newton & (np.abs(v) <= 16 * Geodesic.tol0_)
+        tripb[act] = ~newton & (
+          (np.abs(salp1a[act] - Salp1[act]) + (calp1a[act] - Calp1[act])
+           < Geodesic.tolb_) |
+          (np.abs(Salp1[act] - salp1b[act]) + (Calp1[act] - calp1b[act])
+           < Geodesic.tolb_))
+      # Not converged in maxit1_ iterations
+      hard[idx[act]] = True
+
+      a12 = sig12 / Math.degree
+      if outmask & Geodesic.DISTANCE:
+        s12 = 0 + s12x
+      if outmask & Geodesic.REDUCEDLENGTH:
+        m12 = 0 + m12x
+
+      if outmask & Geodesic.AREA:
+        salp0 = salp1 * cbet1
+        calp0 = GeodesicArray.hypot(calp1, salp1 * sbet1)
+        ssig1, csig1 = GeodesicArray.SinCosNorm(sbet1, calp1 * cbet1)
+        ssig2, csig2 = GeodesicArray.SinCosNorm(sbet2, calp2 * cbet2)
+        k2 = np.square(calp0) * geod._ep2
+        eps = k2 / (2 * (1 + np.sqrt(1 + k2)) + k2)
+        A4 = Math.sq(geod._a) * calp0 * salp0 * geod._e2
+        C4a = list(range(Geodesic.nC4_))
+        geod.C4f(eps, C4a)
+        B41 = Geodesic.SinCosSeries(False, ssig1, csig1, C4a, Geodesic.nC4_)
+        B42 = Geodesic.SinCosSeries(False, ssig2, csig2, C4a, Geodesic.nC4_)
+        S12 = np.where((calp0 != 0) & (salp0 != 0), A4 * (B42 - B41), 0.0)
+        somg12 = np.sin(omg12); domg12 = 1 + np.cos(omg12)
+        dbet1 = 1 + cbet1; dbet2 = 1 + cbet2
+        salp12 = salp2 * calp1 - calp2 * salp1
+        calp12 = calp2 * calp1 + salp2 * salp1
+        fix = (salp12 == 0) & (calp12 < 0)
+        salp12 = np.where(fix, Geodesic.tiny_ * calp1, salp12)
+        calp12 = np.where(fix, -1.0, calp12)
+        alp12 = np.where(
+          (omg12 < 0.75 * math.pi) & (sbet2 - sbet1 < 1.75),
+          2 * np.arctan2(somg12 * (sbet1 * dbet2 + sbet2 * dbet1),
+                         domg12 * (sbet1 * sbet2 + dbet1 * dbet2)),
+          np.arctan2(salp12, calp12))
+        S12 = S12 + geod._c2 * alp12
+        S12 = S12 * (swapp * lonsign * latsign)
+        S12 = S12 + 0
+
+      # Convert calp, salp to azimuth accounting for lonsign, swapp, latsign.
+      if outmask & Geodesic.GEODESICSCALE:
+        M12 = np.where(swapp < 0, M21x, M12x)
+        M21 = np.where(swapp < 0, M12x, M21x)
+      if outmask & Geodesic.AZIMUTH:
+        salp1, salp2 = (np.where(swapp < 0, salp2, salp1),
+                        np.where(swapp < 0, salp1, salp2))
+        calp1, calp2 = (np.where(swapp < 0, calp2, calp1),
+                        np.where(swapp < 0, calp1, calp2))
+        salp1 = salp1 * (swapp * lonsign); calp1 = calp1 * (swapp * latsign)
+        salp2 = salp2 * (swapp * lonsign); calp2 = calp2 * (swapp * latsign)
+        azi1 = 0 - np.arctan2(-salp1, calp1) / Math.degree
+        azi2 = 0 - np.arctan2(-salp2, calp2) / Math.degree
+    finally:
+      np.seterr(**errstate)
+
+    for i in np.nonzero(hard)[0]:
+      (a12[i], s12[i], azi1[i], azi2[i], m12[i], M12[i], M21[i],
+       S12[i]) = geod.GenInverse(float(olat1[i]), float(olon1[i]),
+                                 float(olat2[i]), float(olon2[i]), outmask,
+                                 shortlen)
+    return a12, s12, azi1, azi2, m12, M12, M21, S12
+  GenInverse = staticmethod(GenInverse)
+
+  # return a12, lat2, lon2, azi2, s12, m12, M12, M21, S12
+  def GenPosition(line, arcmode, s12_a12, outmask):
+    """Private: Vectorized version of GeodesicLine.GenPosition"""
+    import numpy as np
+    from geographiclib.geodesic import Geodesic
+    s12_a12 = np.asarray(s12_a12, dtype = float)
+    nan = np.full(len(s12_a12), Math.nan)
+    a12 = lat2 = lon2 = azi2 = s12 = m12 = M12 = M21 = S12 = nan
+    outmask &= line._caps & Geodesic.OUT_ALL
+    if not (arcmode or (line._caps & Geodesic.DISTANCE_IN & Geodesic.OUT_ALL)):
+      # Uninitialized or impossible distance calculation requested
+      return a12, lat2, lon2, azi2, s12, m12, M12, M21, S12
+
+    B12 = 0; AB1 = 0
+    if arcmode:
+      # Interpret s12_a12 as spherical arc length
+      sig12 = s12_a12 * Math.degree
+      s12a = np.abs(s12_a12)
+      s12a = s12a - 180 * np.floor(s12a / 180)
+      ssig12 = np.where(s12a ==  0, 0.0, np.sin(sig12))
+      csig12 = np.where(s12a == 90, 0.0, np.cos(sig12))
+    else:
+      # Interpret s12_a12 as distance
+      tau12 = s12_a12 / (line._b * (1 + line._A1m1))
+      s = np.sin(tau12); c = np.cos(tau12)
+      # tau2 = tau1 + tau12
+      B12 = - Geodesic.SinCosSeries(True,
+                                    line._stau1 * c + line._ctau1 * s,
+                                    line._ctau1 * c - line._stau1 * s,
+                                    line._C1pa, Geodesic.nC1p_)
+      sig12 = tau12 - (B12 - line._B11)
+      ssig12 = np.sin(sig12); csig12 = np.cos(sig12)
+      if abs(line._f) > 0.01:
+        # Reverted distance series is inaccurate for |f| > 1/100, so correct
+        # sig12 with 1 Newton iteration.
+        ssig2 = line._ssig1 * csig12 + line._csig1 * ssig12
+        csig2 = line._csig1 * csig12 - line._ssig1 * ssig12
+        B12 = Geodesic.SinCosSeries(True, ssig2, csig2,
+                                    line._C1a, Geodesic.nC1_)
+        serr = ((1 + line._A1m1) * (sig12 + (B12 - line._B11)) -
+                s12_a12 / line._b)
+        sig12 = sig12 - serr / np.sqrt(1 + line._k2 * np.square(ssig2))
+        ssig12 = np.sin(sig12); csig12 = np.cos(sig12)
+
+    # sig2 = sig1 + sig12
+    ssig2 = line._ssig1 * csig12 + line._csig1 * ssig12
+    csig2 = line._csig1 * csig12 - line._ssig1 * ssig12
+    dn2 = np.sqrt(1 + line._k2 * np.square(ssig2))
+    if outmask & (
+      Geodesic.DISTANCE | Geodesic.REDUCEDLENGTH | Geodesic.GEODESICSCALE):
+      if arcmode or abs(line._f) > 0.01:
+        B12 = Geodesic.SinCosSeries(True, ssig2, csig2,
+                                    line._C1a, Geodesic.nC1_)
+      AB1 = (1 + line._A1m1) * (B12 - line._B11)
+    # sin(bet2) = cos(alp0) * sin(sig2)
+    sbet2 = line._calp0 * ssig2
+    cbet2 = GeodesicArray.hypot(line._salp0, line._calp0 * csig2)
+    # Break the degeneracy of salp0 = 0, csig2 = 0
+    degen = cbet2 == 0
+    cbet2 = np.where(degen, Geodesic.tiny_, cbet2)
+    csig2 = np.where(degen, Geodesic.tiny_, csig2)
+    # tan(omg2) = sin(alp0) * tan(sig2)
+    somg2 = line._salp0 * ssig2; comg2 = csig2
+    # tan(alp0) = cos(sig2)*tan(alp2)
+    salp2 = line._salp0; calp2 = line._calp0 * csig2
+    # omg12 = omg2 - omg1
+    omg12 = np.arctan2(somg2 * line._comg1 - comg2 * line._somg1,
+                       comg2 * line._comg1 + somg2 * line._somg1)
+
+    if outmask & Geodesic.DISTANCE:
+      s12 = line._b * ((1 + line._A1m1) * sig12 + AB1) if arcmode else s12_a12
+
+    if outmask & Geodesic.LONGITUDE:
+      lam12 = omg12 + line._A3c * (
+        sig12 + (Geodesic.SinCosSeries(True, ssig2, csig2,
+                                       line._C3a, Geodesic.nC3_-1)
+                 - line._B31))
+      lon12 = GeodesicArray.AngNormalize(np.fmod(lam12 / Math.degree, 360))
+      lon2 = GeodesicArray.AngNormalize(line._lon1 + lon12)
+
+    if outmask & Geodesic.LATITUDE:
+      lat2 = np.arctan2(sbet2, line._f1 * cbet2) / Math.degree
+
+    if outmask & Geodesic.AZIMUTH:
+      # minus signs give range [-180, 180). 0- converts -0 to +0.
+      azi2 = 0 - np.arctan2(-salp2, calp2) / Math.degree
+
+    if outmask & (Geodesic.REDUCEDLENGTH | Geodesic.GEODESICSCALE):
+      B22 = Geodesic.SinCosSeries(True, ssig2, csig2, line._C2a, Geodesic.nC2_)
+      AB2 = (1 + line._A2m1) * (B22 - line._B21)
+      J12 = (line._A1m1 - line._A2m1) * sig12 + (AB1 - AB2)
+      if outmask & Geodesic.REDUCEDLENGTH:
+        m12 = line._b * ((      dn2 * (line._csig1 * ssig2) -
+                          line._dn1 * (line._ssig1 * csig2))
+                         - line._csig1 * csig2 * J12)
+      if outmask & Geodesic.GEODESICSCALE:
+        t = (line._k2 * (ssig2 - line._ssig1) *
+             (ssig2 + line._ssig1) / (line._dn1 + dn2))
+        M12 = csig12 + (t * ssig2 - csig2 * J12) * line._ssig1 / line._dn1
+        M21 = csig12 - (t * line._ssig1 - line._csig1 * J12) * ssig2 / dn2
+
+    if outmask & Geodesic.AREA:
+      B42 = Geodesic.SinCosSeries(False, ssig2, csig2, line._C4a, Geodesic.nC4_)
+      if line._calp0 == 0 or line._salp0 == 0:
+        # alp12 = alp2 - alp1, used in atan2 so no need to normalized
+        salp12 = salp2 * line._calp1 - calp2 * line._salp1
+        calp12 = calp2 * line._calp1 + salp2 * line._salp1
+        fix = (salp12 == 0) & (calp12 < 0)
+        salp12 = np.where(fix, Geodesic.tiny_ * line._calp1, salp12)
+        calp12 = np.where(fix, -1.0, calp12)
+      else:
+        salp12 = line._calp0 * line._salp0 * np.where(
+          csig12 <= 0, line._csig1 * (1 - csig12) + ssig12 * line._ssig1,
+          ssig12 * (line._csig1 * ssig12 / (1 + csig12) + line._ssig1))
+        calp12 = (Math.sq(line._salp0) +
+                  Math.sq(line._calp0) * line._csig1 * csig2)
+      S12 = line._c2 * np.arctan2(salp12, calp12) + line._A4 * (B42 - line._B41)
+
+    a12 = s12_a12 if arcmode else sig12 / Math.degree
+    return a12, lat2, lon2, azi2, s12, m12, M12, M21, S12
+  GenPosition = staticmethod(GenPosition)
+
+  # return number, perimeter, area
+  def Area(geod, lats, lons, polyline = False, shortlen = 0):
+    """Return the number, perimeter, and area for arrays of vertices."""
+    import numpy as np
+    from geographiclib.geodesic import Geodesic
+    lats = np.asarray(lats, dtype = float)
+    lons = np.asarray(lons, dtype = float)
+    num = len(lats)
+    if num < 2:
+      return num, 0, (Math.nan if polyline else 0)
+    if polyline:
+      s12 = GeodesicArray.GenInverse(
+        geod, lats[:-1], lons[:-1], lats[1:], lons[1:], Geodesic.DISTANCE,
+        shortlen)[1]
+      perimetersum = Accumulator(); perimetersum.AddMany(s12)
+      return num, perimetersum.Sum(), Math.nan
+    lats2 = np.roll(lats, -1); lons2 = np.roll(lons, -1)
+    (dummy, s12, dummy, dummy, dummy, dummy, dummy,
+     S12) = GeodesicArray.GenInverse(
+      geod, lats, lons, lats2, lons2, Geodesic.DISTANCE | Geodesic.AREA,
+      shortlen)
+    perimetersum = Accumulator(); perimetersum.AddMany(s12)
+    perimeter = perimetersum.Sum()
+    area0 = 4 * math.pi * geod._c2
+    areasum = Accumulator(); areasum.AddMany(S12)
+    tempsum = areasum.Sum()
+    crossings = int(GeodesicArray.transit(lons, lons2).sum())
+    if crossings & 1:
+      tempsum += (1 if tempsum < 0 else -1) * area0/2
+    # area is with the clockwise sense, convert to counter-clockwise
+    tempsum = -tempsum
+    # put area in (-area0/2, area0/2]
+    if tempsum > area0/2:
+      tempsum -= area0
+    elif tempsum <= -area0/2:
+      tempsum += area0
+    return num, perimeter, 0 + tempsum
+  Area = staticmethod(Area)
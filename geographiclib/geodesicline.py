@@ -326,6 +326,44 @@ class GeodesicLine(object):
     if outmask & Geodesic.AREA: result['S12'] = S12
     return result
 
+  def Positions(self, distances,
+                outmask = GeodesicCapability.LATITUDE |
+                GeodesicCapability.LONGITUDE | GeodesicCapability.AZIMUTH):
+    """
+    Return the points at the distances along the geodesic line given by
+    the sequence (or numpy array) distances.  Return a dictionary with
+    the same entries as Position, each entry s12, a12, lat2, lon2, ...
+    a numpy array with one element per distance.
+
+    All the points are computed in one vectorized pass with numpy (which
+    must be installed) using the coefficients precomputed for the line.
+    """
+
+    import numpy as np
+    from geographiclib.geodesic import Geodesic
+    from geographiclib.geodesicarray import GeodesicArray
+    s12 = np.asarray(distances, dtype = float)
+    if s12.ndim != 1:
+      raise ValueError("distances must be a 1-d array")
+    bad = np.nonzero(~np.isfinite(s12))[0]
+    if len(bad):
+      raise ValueError("distance " + str(s12[bad[0]]) +
+                       " not a finite number")
+    result = {'lat1': self._lat1, 'lon1': self._lon1, 'azi1': self._azi1,
+              's12': s12}
+    a12, lat2, lon2, azi2, s12, m12, M12, M21, S12 = (
+      GeodesicArray.GenPosition(self, False, s12, outmask))
+    outmask &= Geodesic.OUT_ALL
+    result['a12'] = a12
+    if outmask & Geodesic.LATITUDE: result['lat2'] = lat2
+    if outmask & Geodesic.LONGITUDE: result['lon2'] = lon2
+    if outmask & Geodesic.AZIMUTH: result['azi2'] = azi2
+    if outmask & Geodesic.REDUCEDLENGTH: result['m12'] = m12
+    if outmask & Geodesic.GEODESICSCALE:
+      result['M12'] = M12; result['M21'] = M21
+    if outmask & Geodesic.AREA: result['S12'] = S12
+    return result
+
   def ArcPosition(self, a12,
                   outmask = GeodesicCapability.LATITUDE |
                   GeodesicCapability.LONGITUDE | GeodesicCapability.AZIMUTH |
@@ -38,11 +38,13 @@ class PolygonArea(object):
     return cross
   transit = staticmethod(transit)
 
-  def __init__(self, earth, polyline = False):
+  def __init__(self, earth, polyline = False, shortlen = 0):
     from geographiclib.geodesic import Geodesic
     self._earth = earth
     self._area0 = 4 * math.pi * earth._c2
     self._polyline = polyline
+    # edges shorter than this are solved without Newton's method
+    self._shortlen = shortlen
     self._mask = (Geodesic.LATITUDE | Geodesic.LONGITUDE |
                   Geodesic.DISTANCE |
                   (Geodesic.EMPTY if self._polyline else Geodesic.AREA))
@@ -65,7 +67,7 @@ class PolygonArea(object):
       self._lon0 = self._lon1 = lon
     else:
       _, s12, _, _, _, _, _, S12 = self._earth.GenInverse(
-        self._lat1, self._lon1, lat, lon, self._mask)
+        self._lat1, self._lon1, lat, lon, self._mask, self._shortlen)
       self._perimetersum.Add(s12)
       if not self._polyline:
         self._areasum.Add(S12)
@@ -101,13 +103,14 @@ class PolygonArea(object):
       return self._num, perimeter, area
 
     _, s12, _, _, _, _, _, S12 = self._earth.GenInverse(
-      self._lat1, self._lon1, self._lat0, self._lon0, self._mask)
+      self._lat1, self._lon1, self._lat0, self._lon0, self._mask,
+      self._shortlen)
     perimeter = self._perimetersum.Sum(s12)
     tempsum = Accumulator(self._areasum)
     tempsum.Add(S12)
     crossings = self._crossings + PolygonArea.transit(self._lon1, self._lon0)
     if crossings & 1:
-      tempsum.Add( (1 if tempsum < 0 else -1) * self._area0/2 )
+      tempsum.Add( (1 if tempsum.Sum() < 0 else -1) * self._area0/2 )
     # area is with the clockwise sense.  If !reverse convert to
     # counter-clockwise convention.
     if not reverse: tempsum.Negate()
@@ -142,7 +145,7 @@ class PolygonArea(object):
       _, s12, _, _, _, _, _, S12 = self._earth.GenInverse(
         self._lat1 if i == 0 else lat, self._lon1 if i == 0 else lon,
         self._lat0 if i != 0 else lat, self._lon0 if i != 0 else lon,
-        self._mask)
+        self._mask, self._shortlen)
       perimeter += s12
       if not self._polyline:
         tempsum += S12
@@ -193,7 +196,7 @@ class PolygonArea(object):
     tempsum += S12
     crossings += PolygonArea.transit(self._lon1, lon)
     _, s12, _, _, _, _, _, S12 = self._earth.GenInverse(
-      lat, lon, self._lat0, self._lon0, self._mask)
+      lat, lon, self._lat0, self._lon0, self._mask, self._shortlen)
     perimeter += s12
     tempsum += S12
     crossings += PolygonArea.transit(lon, self._lon0)
@@ -222,10 +225,20 @@ class PolygonArea(object):
     """Return the current point as a lat, lon tuple."""
     return self._lat1, self._lon1
 
-  def Area(earth, points, polyline):
+  def Area(earth, points, polyline, shortlen = 0):
     """Return the number, perimeter, and area for a set of vertices."""
-    poly = PolygonArea(earth, polyline)
+    poly = PolygonArea(earth, polyline, shortlen)
     for p in points:
       poly.AddPoint(p['lat'], p['lon'])
     return poly.Compute(False, True)
   Area = staticmethod(Area)
+
+  def AreaPoints(earth, points, polyline, shortlen = 0):
+    """Return the number, perimeter, and area for (lat, lon) pairs."""
+    from geographiclib.geodesic import Geodesic
+    poly = PolygonArea(earth, polyline, shortlen)
+    for lat, lon in points:
+      Geodesic.CheckPosition(lat, lon)
+      poly.AddPoint(lat, lon)
+    return poly.Compute(False, True)
+  AreaPoints = staticmethod(AreaPoints)
@@ -0,0 +1,35 @@
+"""
+Загрузка функций divide-country.py для тестов
+"""
+
+import logging
+import os
+import sys
+import types
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def loadDivideCountry(path=None):
+    """
+    функции divide-country.py без разбора аргументов и запуска (все до
+    строки #=====), как модуль divide_country
+    path - другая версия скрипта (по умолчанию - из корня репозитория),
+    в процессе загружается только одна версия
+    """
+    if "divide_country" in sys.modules:
+        return sys.modules["divide_country"]
+    if ( path is None ):
+        path = os.path.join(ROOT, "divide-country.py")
+    with open(path) as f:
+        source = f.read()
+    module = types.ModuleType("divide_country")
+    module.__file__ = path
+    # задания для процессов пула ссылаются на функции по имени модуля
+    sys.modules["divide_country"] = module
+    sys.path.insert(0, ROOT)
+    try:
+        exec(compile(source[:source.index("\n#=====")], path, "exec"), module.__dict__)
+    finally:
+        sys.path.remove(ROOT)
+    module.logger = logging.getLogger("divide-country")
+    return module
@@ -0,0 +1,136 @@
+"""
+Площадь многоугольника через numpy (Geodesic.AreaArray) должна совпадать
+с Geodesic.Area: периметр - до 1e-11 (относительно), площадь - до
+n * 1e-15 * c2 для n вершин (n * 2e-13 * c2, если стороны длиннее 170
+градусов дуги)
+
+запуск: python3 -m pytest tests
+"""
+
+import math
+import random
+import sys
+import unittest
+
+from loader import ROOT
+
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+from geographiclib.geodesic import Geodesic
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+def ring(rand, lat0, lon0, radius, n):
+    """
+    случайный простой многоугольник из n вершин вокруг (lat0, lon0)
+    """
+    angles = sorted(rand.uniform(0, 2*math.pi) for i in range(n))
+    lats = []
+    lons = []
+    for a in angles:
+        r = radius * rand.uniform(0.5, 1)
+        lats.append(max(-90, min(90, lat0 + r * math.sin(a))))
+        lons.append(lon0 + r * math.cos(a))
+    return ( lats, lons )
+
+@unittest.skipIf(numpy is None, "AreaArray needs numpy")
+class AreaArrayTest(unittest.TestCase):
+
+    geod = Geodesic.WGS84
+
+    def assertSameArea(self, lats, lons, polyline=False, area=1e-15):
+        expected = self.geod.Area([ { "lat": lat, "lon": lon } for lat, lon in zip(lats, lons) ],
+            polyline)
+        result = self.geod.AreaArray(lats, lons, polyline)
+        self.assertEqual(result["number"], expected["number"])
+        self.assertLessEqual(abs(result["perimeter"] - expected["perimeter"]),
+            1e-11 * expected["perimeter"])
+        if polyline:
+            self.assertNotIn("area", result)
+        else:
+            self.assertLessEqual(abs(result["area"] - expected["area"]),
+                max(len(lats), 1) * area * self.geod._c2)
+        return result
+
+    def test_random(self):
+        rand = random.Random(1)
+        for k in range(200):
+            radius = rand.choice([ 1e-3, 0.1, 5, 40 ])
+            lats, lons = ring(rand, rand.uniform(-80, 80), rand.uniform(-180, 180),
+                radius, rand.randint(3, 60))
+            if ( rand.random() < 0.5 ):
+                lats.reverse()
+                lons.reverse()
+            with self.subTest(k=k):
+                self.assertSameArea(lats, lons)
+
+    def test_pole(self):
+        rand = random.Random(2)
+        for lat in ( 89.9, 80, 45, -60, -89 ):
+            lons = [ -180 + i * 360 / 50 + rand.uniform(0, 3) for i in range(50) ]
+            lats = [ lat + rand.uniform(-0.05, 0.05) for i in range(50) ]
+            with self.subTest(lat=lat):
+                result = self.assertSameArea(lats, lons)
+                # кольцо вокруг полюса: площадь - шапка полюса
+                self.assertGreater(abs(result["area"]), 0)
+                self.assertSameArea(lats[::-1], lons[::-1])
+
+    def test_antimeridian(self):
+        rand = random.Random(3)
+        for k in range(20):
+            lats, lons = ring(rand, rand.uniform(-70, 70), 180, rand.choice([ 0.01, 1, 10 ]), 30)
+            # долготы в (-180, 180]: кольцо пересекает линию перемены дат
+            lons = [ lon - 360 if lon > 180 else lon for lon in lons ]
+            with self.subTest(k=k):
+                self.assertSameArea(lats, lons)
+
+    def test_meridian_equator(self):
+        # стороны по меридианам и по экватору
+        cases = [
+            ( [ 0, 0, 10, 10 ], [ 0, 10, 10, 0 ] ),
+            ( [ -5, 5, 5, -5 ], [ 20, 20, 30, 30 ] ),
+            ( [ 0, 0, 0, 30 ], [ -170, 170, 100, 100 ] ),
+            ( [ -90, 0, 0 ], [ 0, 0, 90 ] ),
+            ( [ 90, 0, 0, 0 ], [ 0, 0, 90, 180 ] ),
+            ( [ 0, 0, 0 ], [ 0, 120, -120 ] ),
+            ( [ 10, 20, 30, 20 ], [ 45, 45, 45, 45 ] )
+        ]
+        for lats, lons in cases:
+            with self.subTest(lats=lats, lons=lons):
+                self.assertSameArea(lats, lons)
+                self.assertSameArea(lats[::-1], lons[::-1])
+
+    def test_long_edges(self):
+        # стороны почти через полмира: площадь чувствительна к азимуту
+        rand = random.Random(5)
+        for k in range(100):
+            lat, lon = rand.uniform(-80, 80), rand.uniform(-180, 180)
+            d = 10 ** rand.uniform(-6, 0.5)
+            lats = [ lat, max(-90, min(90, -lat + rand.uniform(-d, d))), rand.uniform(-90, 90) ]
+            lons = [ lon, lon + 180 + rand.uniform(-d, d), rand.uniform(-180, 180) ]
+            lons = [ lon - 360 if lon >= 180 else lon for lon in lons ]
+            with self.subTest(k=k):
+                self.assertSameArea(lats, lons, area=2e-13)
+
+    def test_few_points(self):
+        for lats, lons in ( ( [], [] ), ( [ 10 ], [ 20 ] ) ):
+            for polyline in ( False, True ):
+                with self.subTest(n=len(lats), polyline=polyline):
+                    expected = self.geod.Area([ { "lat": lat, "lon": lon }
+                        for lat, lon in zip(lats, lons) ], polyline)
+                    self.assertEqual(self.geod.AreaArray(lats, lons, polyline), expected)
+
+    def test_polyline(self):
+        rand = random.Random(4)
+        for k in range(50):
+            lats, lons = ring(rand, rand.uniform(-80, 80), rand.uniform(-180, 180),
+                rand.choice([ 0.01, 1, 20 ]), rand.randint(2, 40))
+            with self.subTest(k=k):
+                self.assertSameArea(lats, lons, polyline=True)
+        self.assertSameArea([ 0, 0, 89, -89 ], [ 0, 179.5, 0, 180 ], polyline=True)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,69 @@
+"""
+Двоичный кэш прочитанных данных: чтение записанного кэша и отказ
+от пустого, чужого или обрезанного файла
+
+запуск: python3 -m pytest tests
+"""
+
+import os
+import tempfile
+import unittest
+
+from loader import ROOT, loadDivideCountry
+
+dc = loadDivideCountry()
+
+SAMPLE = os.path.join(ROOT, "tests", "data", "sample.osm")
+
+class OsmCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.cachefile = os.path.join(self.tmpdir.name, "sample.osmcache")
+        self.osm = dc.readOsmFile(SAMPLE)
+        dc.writeOsmCache(self.cachefile, self.osm)
+        with open(self.cachefile, "rb") as f:
+            self.data = f.read()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def rewrite(self, data):
+        with open(self.cachefile, "wb") as f:
+            f.write(data)
+
+    def test_roundtrip(self):
+        result = dc.readOsmCache(self.cachefile)
+        self.assertEqual(list(result["nodes"].ids), list(self.osm["nodes"].ids))
+        self.assertEqual(list(result["nodes"].lats), list(self.osm["nodes"].lats))
+        self.assertEqual(list(result["nodes"].lons), list(self.osm["nodes"].lons))
+        self.assertEqual({ w: list(refs) for w, refs in result["ways"].items() },
+            { w: list(refs) for w, refs in self.osm["ways"].items() })
+        for t in [ "outer", "inner" ]:
+            self.assertEqual({ r: list(refs) for r, refs in result["rels"][t].items() },
+                self.osm["rels"][t])
+
+    def test_empty(self):
+        self.rewrite(b"")
+        self.assertIsNone(dc.readOsmCache(self.cachefile))
+
+    def test_short_header(self):
+        self.rewrite(self.data[:dc.OSM_CACHE_HEADER.size-1])
+        self.assertIsNone(dc.readOsmCache(self.cachefile))
+
+    def test_magic(self):
+        self.rewrite(b"X" + self.data[1:])
+        self.assertIsNone(dc.readOsmCache(self.cachefile))
+
+    def test_truncated(self):
+        for size in ( dc.OSM_CACHE_HEADER.size, len(self.data)-8, len(self.data)-1 ):
+            with self.subTest(size):
+                self.rewrite(self.data[:size])
+                self.assertIsNone(dc.readOsmCache(self.cachefile))
+
+    def test_trailing_data(self):
+        self.rewrite(self.data + bytes(8))
+        self.assertIsNone(dc.readOsmCache(self.cachefile))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,66 @@
+"""
+Чтение сжатых файлов: gzip, bzip2 и xz распаковываются на лету,
+исходный файл закрывается вместе с распаковщиком
+
+запуск: python3 -m pytest tests
+"""
+
+import bz2
+import gc
+import gzip
+import lzma
+import os
+import tempfile
+import unittest
+import warnings
+
+from loader import ROOT, loadDivideCountry
+
+dc = loadDivideCountry()
+
+SAMPLE = os.path.join(ROOT, "tests", "data", "sample.osm")
+
+class CompressedTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        with open(SAMPLE, "rb") as f:
+            self.data = f.read()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def compressed(self, module, ext):
+        filename = os.path.join(self.tmpdir.name, "sample.osm." + ext)
+        with module.open(filename, "wb") as f:
+            f.write(self.data)
+        return filename
+
+    def test_read(self):
+        expected = dc.readOsmFile(SAMPLE)
+        for module, ext in ( ( gzip, "gz" ), ( bz2, "bz2" ), ( lzma, "xz" ) ):
+            with self.subTest(ext):
+                filename = self.compressed(module, ext)
+                f = dc.openOsmFile(filename)
+                self.assertEqual(f.read(), self.data)
+                f.close()
+                result = dc.readOsmFile(filename)
+                self.assertEqual(list(result["nodes"].ids), list(expected["nodes"].ids))
+                self.assertEqual(result["ways"], expected["ways"])
+                self.assertEqual(result["rels"], expected["rels"])
+
+    def test_no_unclosed_file(self):
+        for module, ext in ( ( gzip, "gz" ), ( bz2, "bz2" ), ( lzma, "xz" ) ):
+            with self.subTest(ext):
+                filename = self.compressed(module, ext)
+                with warnings.catch_warnings(record=True) as caught:
+                    warnings.simplefilter("always", ResourceWarning)
+                    f = dc.openOsmFile(filename)
+                    f.read(100)
+                    f.close()
+                    del f
+                    gc.collect()
+                self.assertEqual([ w for w in caught if issubclass(w.category, ResourceWarning) ], [])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,106 @@
+"""
+Обратная задача сразу для многих пар точек (Geodesic.InverseMany) должна
+совпадать с Geodesic.Inverse: расстояния - до 1e-11 (относительно),
+азимуты - до 1e-9 градуса, площадь S12 - до 4e-15 * c2 (для почти
+противоположных точек - до 2e-13 * c2)
+
+запуск: python3 -m pytest tests
+"""
+
+import random
+import sys
+import unittest
+
+from loader import ROOT
+
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+from geographiclib.geodesic import Geodesic
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+def clamp(lat):
+    return max(-90, min(90, lat))
+
+@unittest.skipIf(numpy is None, "InverseMany needs numpy")
+class InverseManyTest(unittest.TestCase):
+
+    geod = Geodesic.WGS84
+
+    def assertSameInverse(self, pairs, area=4e-15):
+        result = self.geod.InverseMany(*zip(*pairs), outmask=Geodesic.ALL)
+        self.assertEqual(len(result["s12"]), len(pairs))
+        for i, pair in enumerate(pairs):
+            expected = self.geod.Inverse(*pair, outmask=Geodesic.ALL)
+            with self.subTest(pair=pair):
+                for key in ( "s12", "a12", "m12" ):
+                    self.assertLessEqual(abs(result[key][i] - expected[key]),
+                        1e-11 * abs(expected[key]) + 1e-15, key)
+                for key in ( "azi1", "azi2" ):
+                    d = (result[key][i] - expected[key] + 180) % 360 - 180
+                    self.assertLessEqual(abs(d), 1e-9, key)
+                for key in ( "M12", "M21" ):
+                    self.assertLessEqual(abs(result[key][i] - expected[key]), 1e-14, key)
+                self.assertLessEqual(abs(result["S12"][i] - expected["S12"]),
+                    area * self.geod._c2)
+
+    def test_short(self):
+        rand = random.Random(1)
+        pairs = []
+        for k in range(500):
+            lat, lon = rand.uniform(-90, 90), rand.uniform(-180, 180)
+            d = 10 ** rand.uniform(-9, -1)
+            pairs.append(( lat, lon, clamp(lat + rand.uniform(-d, d)), lon + rand.uniform(-d, d) ))
+        self.assertSameInverse(pairs)
+
+    def test_random(self):
+        rand = random.Random(2)
+        pairs = [ ( rand.uniform(-90, 90), rand.uniform(-180, 180),
+            rand.uniform(-90, 90), rand.uniform(-180, 180) ) for k in range(500) ]
+        self.assertSameInverse(pairs)
+
+    def test_antipodal(self):
+        rand = random.Random(3)
+        pairs = []
+        for k in range(500):
+            lat, lon = rand.uniform(-90, 90), rand.uniform(-180, 180)
+            d = 10 ** rand.uniform(-7, 0.5)
+            pairs.append(( lat, lon, clamp(-lat + rand.uniform(-d, d)),
+                lon + 180 + rand.uniform(-d, d) ))
+        self.assertSameInverse(pairs, area=2e-13)
+
+    def test_meridian(self):
+        rand = random.Random(4)
+        pairs = [ ( 90, 0, 10, 20 ), ( -90, 0, 10, 20 ), ( 90, 0, -90, 0 ), ( -90, 30, 0, 30 ) ]
+        for k in range(100):
+            lon = rand.uniform(-180, 180)
+            pairs.append(( rand.choice([ 90, -90, rand.uniform(-90, 90) ]), lon,
+                rand.uniform(-90, 90), lon ))
+        self.assertSameInverse(pairs)
+
+    def test_equator(self):
+        rand = random.Random(5)
+        pairs = [ ( 0, 0, 0, 179.5 ), ( 0, 0, 0, 180 ), ( 0, -170, 0, 170 ), ( 0, 10, 0, 10 ) ]
+        pairs += [ ( 0, rand.uniform(-180, 180), 0, rand.uniform(-180, 180) ) for k in range(100) ]
+        self.assertSameInverse(pairs)
+
+    def test_empty(self):
+        result = self.geod.InverseMany([], [], [], [], Geodesic.ALL)
+        for key in ( "a12", "s12", "azi1", "azi2", "m12", "M12", "M21", "S12" ):
+            self.assertEqual(len(result[key]), 0, key)
+
+    def test_bad_input(self):
+        with self.assertRaises(ValueError):
+            self.geod.InverseMany([ 10, 91 ], [ 0, 0 ], [ 0, 0 ], [ 0, 0 ])
+        with self.assertRaises(ValueError):
+            self.geod.InverseMany([ 10 ], [ 0 ], [ -90.5 ], [ 0 ])
+        with self.assertRaises(ValueError):
+            self.geod.InverseMany([ 10, 20 ], [ 0 ], [ 0, 0 ], [ 0, 0 ])
+        with self.assertRaises(ValueError):
+            self.geod.InverseMany([ [ 10 ] ], [ [ 0 ] ], [ [ 0 ] ], [ [ 0 ] ])
+
+if __name__ == "__main__":
+    unittest.main()
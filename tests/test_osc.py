@@ -0,0 +1,63 @@
+"""
+Применение osmChange к сохраненному состоянию: отношения, линий
+которых нет в состоянии, удаляются с предупреждением, области без
+соседей уходят из частей, как при полном запуске
+
+запуск: python3 -m pytest tests
+"""
+
+import unittest
+from array import array
+
+from loader import loadDivideCountry
+
+dc = loadDivideCountry()
+
+class ApplyChangesTest(unittest.TestCase):
+
+    def setUp(self):
+        dc.osm = {
+            "nodes": dc.NodeStore(array("q", [1, 2, 3]), array("d", [0, 0, 1]), array("d", [0, 1, 0])),
+            "ways": { 10: array("q", [1, 2, 3, 1]) },
+            "rels": { "outer": { 100: [10] }, "inner": { 100: [] } }
+        }
+
+    def changes(self, rels=None, ways=None):
+        return { "rels": rels or {}, "ways": ways or {}, "nodes": {} }
+
+    def test_missing_way(self):
+        with self.assertLogs(dc.logger, "WARNING") as logs:
+            affected = dc.applyChanges(self.changes(rels={ 200: ( [10, 11], [] ) }))
+        self.assertEqual(affected, { 200 })
+        self.assertNotIn(200, dc.osm["rels"]["outer"])
+        self.assertIn(100, dc.osm["rels"]["outer"])
+        self.assertEqual(len(logs.output), 1)
+        self.assertIn("relation 200 dropped", logs.output[0])
+        self.assertIn("ways [11]", logs.output[0])
+
+    def test_missing_node(self):
+        with self.assertLogs(dc.logger, "WARNING") as logs:
+            dc.applyChanges(self.changes(rels={ 300: ( [12], [] ) },
+                ways={ 12: array("q", [1, 99, 1]) }))
+        self.assertNotIn(300, dc.osm["rels"]["outer"])
+        self.assertIn("nodes of ways [12]", logs.output[0])
+
+    def test_complete(self):
+        with self.assertNoLogs(dc.logger, "WARNING"):
+            affected = dc.applyChanges(self.changes(rels={ 200: ( [10], [] ) }))
+        self.assertEqual(affected, { 200 })
+        self.assertEqual(dc.osm["rels"]["outer"][200], [10])
+
+class UpdatePartsTest(unittest.TestCase):
+
+    def test_lost_neighbours(self):
+        # область 2 удалена, у не измененной области 1 не осталось соседей
+        dc.shapes_areas = { 1: 1.0, 3: 1.0, 4: 1.0, 5: 1.0 }
+        G = { 3: { 4: 1.0 }, 4: { 3: 1.0, 5: 1.0 }, 5: { 4: 1.0 } }
+        parts = [ [1, 2, 3], [4, 5] ]
+        dc.updateParts(dc.Graph(G, [1, 3, 4, 5]), parts, { 2 })
+        self.assertEqual(sorted(parts[0] + parts[1]), [3, 4, 5])
+        self.assertNotIn(1, parts[0])
+
+if __name__ == "__main__":
+    unittest.main()
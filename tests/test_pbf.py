@@ -0,0 +1,175 @@
+"""
+Чтение OSM PBF: файл-образец в формате XML переводится в PBF, и
+разобранные данные обоих форматов должны совпасть
+
+запуск: python3 -m pytest tests
+"""
+
+import gzip
+import os
+import struct
+import tempfile
+import unittest
+import zlib
+from lxml import etree
+
+from loader import ROOT, loadDivideCountry
+
+dc = loadDivideCountry()
+
+SAMPLE = os.path.join(ROOT, "tests", "data", "sample.osm")
+
+# запись PBF: только то, что читает parsePbfFile
+
+def varint(value):
+    out = bytearray()
+    while True:
+        b = value & 0x7f
+        value >>= 7
+        if value:
+            out.append(b | 0x80)
+        else:
+            out.append(b)
+            return bytes(out)
+
+def zigzag(value):
+    return (value << 1) ^ (value >> 63)
+
+def field(number, value):
+    if isinstance(value, bytes):
+        return varint(number << 3 | 2) + varint(len(value)) + value
+    return varint(number << 3) + varint(value)
+
+def packed(number, values):
+    return field(number, b"".join(varint(v) for v in values))
+
+def delta(values):
+    prev = 0
+    result = []
+    for v in values:
+        result.append(zigzag(v - prev))
+        prev = v
+    return result
+
+def blob(blobtype, data, compress=True):
+    body = field(2, len(data)) + (field(3, zlib.compress(data)) if compress else field(1, data))
+    head = field(1, blobtype.encode()) + field(3, len(body))
+    return struct.pack(">I", len(head)) + head + body
+
+def readXml(filename):
+    """
+    элементы XML файла: [ ( id, lat, lon ) ], [ ( id, точки ) ],
+    [ ( id, [ ( тип, id, роль ) ] ) ]
+    """
+    nodes = []
+    ways = []
+    rels = []
+    for event, elem in etree.iterparse(filename):
+        if (elem.tag == "node"):
+            nodes.append(( int(elem.get("id")), elem.get("lat"), elem.get("lon") ))
+        elif (elem.tag == "way"):
+            ways.append(( int(elem.get("id")), [ int(nd.get("ref")) for nd in elem.findall("nd") ] ))
+        elif (elem.tag == "relation"):
+            rels.append(( int(elem.get("id")), [ ( m.get("type"), int(m.get("ref")), m.get("role") )
+                for m in elem.findall("member") ] ))
+    return ( nodes, ways, rels )
+
+def nanodegrees(value, granularity, offset):
+    """
+    координата в единицах granularity нанградусов со смещением offset
+    """
+    units = int(value.replace(".", "").replace("-", "")) * 100 * (-1 if value.startswith("-") else 1)
+    assert len(value.split(".")[1]) == 7
+    assert (units - offset) % granularity == 0
+    return (units - offset) // granularity
+
+def writePbf(filename, xmlfile, blocksize=3, header=("OsmSchema-V0.6", "DenseNodes")):
+    """
+    перевод XML в PBF: по blocksize элементов в блоке, первые точки -
+    обычные Node, остальные - DenseNodes с другими granularity и
+    смещениями, каждый третий блок не сжат
+    """
+    nodes, ways, rels = readXml(xmlfile)
+    roles = sorted(set(role for relid, members in rels for t, ref, role in members))
+    strings = [ b"" ] + [ role.encode() for role in roles ]
+    table = field(1, b"".join(field(1, s) for s in strings))
+    types = { "node": 0, "way": 1, "relation": 2 }
+    blocks = []
+    plain = nodes[:blocksize]
+    blocks.append(table + field(2, b"".join(field(1, field(1, zigzag(i))
+        + field(8, zigzag(nanodegrees(lat, 100, 0))) + field(9, zigzag(nanodegrees(lon, 100, 0))))
+        for i, lat, lon in plain)))
+    dense = nodes[blocksize:]
+    for k in range(0, len(dense), blocksize):
+        chunk = dense[k:k+blocksize]
+        granularity, latoffset, lonoffset = ( 100, 0, 0 ) if k % 2 == 0 else ( 50, -500, 700 )
+        group = packed(1, delta([ i for i, lat, lon in chunk ])) \
+            + packed(8, delta([ nanodegrees(lat, granularity, latoffset) for i, lat, lon in chunk ])) \
+            + packed(9, delta([ nanodegrees(lon, granularity, lonoffset) for i, lat, lon in chunk ]))
+        options = b""
+        if ( granularity != 100 ):
+            options = field(17, granularity) + field(19, latoffset & (1<<64)-1) + field(20, lonoffset)
+        blocks.append(table + field(2, field(2, group)) + options)
+    for k in range(0, len(ways), blocksize):
+        blocks.append(table + field(2, b"".join(field(3, field(1, wayid) + packed(8, delta(refs)))
+            for wayid, refs in ways[k:k+blocksize])))
+    for k in range(0, len(rels), blocksize):
+        blocks.append(table + field(2, b"".join(field(4, field(1, relid)
+            + packed(8, [ strings.index(role.encode()) for t, ref, role in members ])
+            + packed(9, delta([ ref for t, ref, role in members ]))
+            + packed(10, [ types[t] for t, ref, role in members ]))
+            for relid, members in rels[k:k+blocksize])))
+    with open(filename, "wb") as f:
+        f.write(blob("OSMHeader", b"".join(field(4, feature.encode()) for feature in header)))
+        for i in range(len(blocks)):
+            f.write(blob("OSMData", blocks[i], i % 3 != 2))
+
+class PbfTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.pbf = os.path.join(self.tmpdir.name, "sample.osm.pbf")
+        writePbf(self.pbf, SAMPLE)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def assertSameOsm(self, expected, result):
+        self.assertEqual(list(expected["nodes"].ids), list(result["nodes"].ids))
+        self.assertEqual(list(expected["nodes"].lats), list(result["nodes"].lats))
+        self.assertEqual(list(expected["nodes"].lons), list(result["nodes"].lons))
+        self.assertEqual(expected["ways"], result["ways"])
+        self.assertEqual(expected["rels"], result["rels"])
+
+    def test_fixture(self):
+        osm = dc.readOsmFile(SAMPLE)
+        # точки идут не по порядку id, сломанные линия и отношения удалены
+        self.assertEqual(len(osm["nodes"]), 16)
+        self.assertEqual(list(osm["nodes"].ids), sorted(osm["nodes"].ids))
+        self.assertEqual(len(osm["ways"]), 18)
+        self.assertEqual(sorted(osm["rels"]["outer"]), [ 12, 42, 555, 1001, 31337, 7000000 ])
+        self.assertEqual(len(osm["rels"]["inner"][1001]), 1)
+
+    def test_same_as_xml(self):
+        self.assertSameOsm(dc.readOsmFile(SAMPLE), dc.readOsmFile(self.pbf, fmt="pbf"))
+
+    def test_twopass(self):
+        self.assertSameOsm(dc.readOsmFile(SAMPLE, twopass=True),
+            dc.readOsmFile(self.pbf, twopass=True, fmt="pbf"))
+
+    def test_jobs(self):
+        # блоков больше, чем заданий в работе у poolImap
+        self.assertSameOsm(dc.readOsmFile(SAMPLE), dc.readOsmFile(self.pbf, fmt="pbf", jobs=2))
+
+    def test_gzip(self):
+        with open(self.pbf, "rb") as f, gzip.open(self.pbf + ".gz", "wb") as out:
+            out.write(f.read())
+        self.assertSameOsm(dc.readOsmFile(SAMPLE), dc.readOsmFile(self.pbf + ".gz", fmt="pbf"))
+
+    def test_unsupported_feature(self):
+        writePbf(self.pbf, SAMPLE, header=("OsmSchema-V0.6", "HistoricalInformation"))
+        with self.assertRaises(dc.PbfException):
+            dc.readOsmFile(self.pbf, fmt="pbf")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,95 @@
+"""
+Формулы коротких линий (shortlen) против полного решения обратной
+задачи на WGS84: расстояние - до 1e-8 м, площадь ребра S12 - до
+0.005 м2 при 100 м, 0.1 м2 при 300 м и 5 м2 при 1 км; AreaArray и
+AreaPoints с shortlen должны давать одно и то же
+
+запуск: python3 -m pytest tests
+"""
+
+import math
+import random
+import sys
+import unittest
+
+from loader import ROOT
+
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+from geographiclib.geodesic import Geodesic
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# длина ребра (м) -> допуск S12 (м2)
+AREA_ERRORS = { 10: 0.005, 100: 0.005, 300: 0.1, 1000: 5 }
+
+def edge(rand, geod, length):
+    """
+    случайное ребро длиной от length/2 до length; каждое четвертое -
+    у полюса, где разность долгот велика
+    """
+    if ( rand.random() < 0.25 ):
+        lat1 = rand.choice([ 1, -1 ]) * (90 - 10 ** rand.uniform(-5, 1))
+    else:
+        lat1 = rand.uniform(-90, 90)
+    lon1 = rand.uniform(-180, 180)
+    p = geod.Direct(lat1, lon1, rand.uniform(-180, 180), length * rand.uniform(0.5, 1))
+    return ( lat1, lon1, p["lat2"], p["lon2"] )
+
+class ShortLineTest(unittest.TestCase):
+
+    geod = Geodesic.WGS84
+    mask = Geodesic.DISTANCE | Geodesic.AREA
+
+    def test_inverse(self):
+        rand = random.Random(1)
+        for length, area in sorted(AREA_ERRORS.items()):
+            for k in range(1000):
+                e = edge(rand, self.geod, length)
+                short = self.geod.GenInverse(*e, outmask=self.mask, shortlen=length)
+                full = self.geod.GenInverse(*e, outmask=self.mask, shortlen=0)
+                with self.subTest(length=length, edge=e):
+                    # a12, s12, azi1, azi2, m12, M12, M21, S12
+                    self.assertLessEqual(abs(short[1] - full[1]), 1e-8)
+                    self.assertLessEqual(abs(short[7] - full[7]), area)
+
+    def test_long_edges(self):
+        # ребра длиннее shortlen решаются полностью
+        rand = random.Random(2)
+        for k in range(100):
+            e = edge(rand, self.geod, 5000)
+            self.assertEqual(self.geod.GenInverse(*e, outmask=self.mask, shortlen=1000),
+                self.geod.GenInverse(*e, outmask=self.mask, shortlen=0))
+
+@unittest.skipIf(numpy is None, "AreaArray needs numpy")
+class ShortLineAreaTest(unittest.TestCase):
+
+    geod = Geodesic.WGS84
+
+    def test_area_array(self):
+        rand = random.Random(3)
+        for lat0 in ( 0, 35, -55, 80, 89.99, -89.999 ):
+            # кольцо из ребер от десятков метров до пары километров
+            n = 200
+            radius = rand.choice([ 0.01, 0.05, 0.2 ])
+            lats = []
+            lons = []
+            for i in range(n):
+                a = 2 * math.pi * i / n
+                lats.append(max(-90, min(90, lat0 + radius * math.sin(a))))
+                lons.append(radius * math.cos(a) / max(math.cos(math.radians(lat0)), 0.01))
+            for shortlen in ( 0, 300, 1000 ):
+                with self.subTest(lat0=lat0, shortlen=shortlen):
+                    expected = self.geod.AreaPoints(lats, lons, shortlen=shortlen)
+                    result = self.geod.AreaArray(lats, lons, shortlen=shortlen)
+                    self.assertEqual(result["number"], n)
+                    self.assertLessEqual(abs(result["perimeter"] - expected["perimeter"]),
+                        1e-11 * expected["perimeter"])
+                    self.assertLessEqual(abs(result["area"] - expected["area"]),
+                        n * 4e-15 * self.geod._c2)
+
+if __name__ == "__main__":
+    unittest.main()